@@ -0,0 +1,163 @@
+import json
+import math
+import os
+import threading
+import time
+
+ACTIVITY_PATH = os.getenv("SUBREDDIT_ACTIVITY", "subreddit_activity.json")
+
+# A priori (un post par heure, pesant un quart d'heure d'observation) :
+# remplacé par les données réelles dès les premiers runs
+PRIOR_POSTS = 0.25
+PRIOR_SECONDS = 900.0
+# Dix commentaires par heure sur la même fenêtre
+PRIOR_COMMENTS = 2.5
+
+# Compteurs de l'état d'un subreddit par type d'élément observé
+_COUNTERS = {
+    "posts": ("posts", "seconds", "observed_until", PRIOR_POSTS),
+    "comments": (
+        "comments",
+        "comment_seconds",
+        "comments_observed_until",
+        PRIOR_COMMENTS,
+    ),
+}
+
+
+class ActivityScheduler:
+    """Taux d'arrivée de posts (et de commentaires, pour le flux de commentaires
+    du daemon) appris par subreddit, et répartition du budget API en proportion.
+
+    Chaque extraction d'un subreddit est une observation : n posts sur une
+    fenêtre de temps (depuis la précédente observation, ou depuis le plus vieux
+    post lu si le listing a été tronqué par la limite). Posts et durée observés
+    sont cumulés avec une décroissance exponentielle (demi-vie half_life) pour
+    suivre les changements d'activité. L'état n'est écrit sur disque que par
+    save(), une fois les données du run persistées.
+    """
+
+    def __init__(self, path=ACTIVITY_PATH, half_life=7 * 86400):
+        self.path = path
+        self.half_life = half_life
+        self.state = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def rate(self, sub_name, kind="posts"):
+        """Posts (ou commentaires, kind="comments") par seconde estimés."""
+        count_key, seconds_key, _, prior = _COUNTERS[kind]
+        stats = self.state.get(sub_name, {})
+        count = stats.get(count_key, 0.0) + prior
+        return count / (stats.get(seconds_key, 0.0) + PRIOR_SECONDS)
+
+    def expected_backlog(self, sub_name, now=None):
+        """Posts attendus depuis la dernière observation, None si jamais observé."""
+        observed_until = self.state.get(sub_name, {}).get("observed_until")
+        if observed_until is None:
+            return None
+        now = now or time.time()
+        return self.rate(sub_name) * max(0.0, now - observed_until)
+
+    def observe(
+        self,
+        sub_name,
+        count,
+        oldest_utc=None,
+        truncated=False,
+        since=None,
+        kind="posts",
+    ):
+        """count posts (ou commentaires) lus, dont le plus ancien date de
+        oldest_utc ; truncated si le listing s'est arrêté sur la limite (éléments
+        plus anciens non vus) ; since : created_utc du watermark où le listing
+        s'est arrêté."""
+        count_key, seconds_key, until_key, _ = _COUNTERS[kind]
+        now = time.time()
+        with self._lock:
+            stats = self.state.setdefault(sub_name, {"posts": 0.0, "seconds": 0.0})
+            if truncated:
+                start = oldest_utc
+            else:
+                start = stats.get(until_key) or since or oldest_utc
+            stats[until_key] = now
+            if start is None or now - start < 1:
+                return
+            window = now - start
+            decay = 0.5 ** (window / self.half_life)
+            stats[count_key] = stats.get(count_key, 0.0) * decay + count
+            stats[seconds_key] = stats.get(seconds_key, 0.0) * decay + window
+
+    def _weights(self, subreddits, now):
+        backlogs = {s: self.expected_backlog(s, now) for s in subreddits}
+        known = [b for b in backlogs.values() if b is not None]
+        default = sum(known) / len(known) if known else 1.0
+        return {s: default if b is None else b for s, b in backlogs.items()}
+
+    def due(self, subreddits, min_expected=1.0, max_age=86400):
+        """Subreddits qui valent une requête : au moins min_expected nouveaux posts
+        attendus, jamais observés, ou pas interrogés depuis max_age secondes."""
+        now = time.time()
+        due = []
+        for sub_name in subreddits:
+            backlog = self.expected_backlog(sub_name, now)
+            observed_until = self.state.get(sub_name, {}).get("observed_until", 0)
+            if (
+                backlog is None
+                or backlog >= min_expected
+                or now - observed_until >= max_age
+            ):
+                due.append(sub_name)
+        return due
+
+    def allocate_limits(self, subreddits, total_posts, min_limit=5, max_limit=1000):
+        """Répartit total_posts (la limite de posts du run) en proportion du
+        nombre de nouveaux posts attendus par subreddit."""
+        weights = self._weights(subreddits, time.time())
+        total_weight = sum(weights.values())
+        limits = {}
+        for sub_name, weight in weights.items():
+            share = (
+                total_posts * weight / total_weight
+                if total_weight
+                else total_posts / len(subreddits)
+            )
+            limits[sub_name] = int(min(max_limit, max(min_limit, math.ceil(share))))
+        return limits
+
+    def poll_intervals(self, subreddits, polls_per_minute, min_interval, max_interval):
+        """Intervalle de polling par subreddit : les polls_per_minute du budget
+        sont répartis en proportion des taux d'arrivée, posts et commentaires
+        confondus (0 = pas de limite)."""
+        if not polls_per_minute:
+            return dict.fromkeys(subreddits, min_interval)
+        rates = {s: self.rate(s) + self.rate(s, "comments") for s in subreddits}
+        total_rate = sum(rates.values())
+        intervals = {}
+        for sub_name, rate in rates.items():
+            polls_per_second = polls_per_minute / 60 * rate / total_rate
+            intervals[sub_name] = min(
+                max_interval, max(min_interval, 1 / polls_per_second)
+            )
+        return intervals
+
+    def poll_limit(
+        self, sub_name, interval, min_limit=100, max_limit=1000, kind="posts"
+    ):
+        """Posts (ou commentaires) à demander pour couvrir un intervalle de
+        polling sans troncature, quand aucun watermark n'arrête le listing."""
+        expected = self.rate(sub_name, kind) * interval
+        return int(min(max_limit, max(min_limit, math.ceil(expected * 2))))
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            state = json.dumps(self.state)
+        # Écriture atomique, comme le checkpoint d'extraction
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(state)
+        os.replace(tmp_path, self.path)
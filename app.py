@@ -12,6 +12,8 @@ import datetime
 import matplotlib.pyplot as plt
 import tempfile
 
+from stream_codecs import find_compressed
+
 try:
     from fpdf import FPDF
 
@@ -773,6 +775,7 @@ def generate_pdf_report_reportlab(df_p, df_s, df_c):
         return None
 
     import io
+
     # import inutilisé supprimé
 
     buffer = io.BytesIO()
@@ -896,6 +899,7 @@ limit = st.sidebar.number_input("Limite Posts", min_value=1, value=100)
 comments_limit = st.sidebar.number_input(
     "Limite Commentaires/Post", min_value=0, value=5
 )
+workers = st.sidebar.number_input("Threads d'extraction", min_value=1, value=4)
 
 st.sidebar.markdown("---")
 st.sidebar.header("Maintenance")
@@ -929,10 +933,19 @@ if st.sidebar.button("🗑️ Vider HDFS & BD"):
             "-d",
             "reddit_db",
             "-c",
-            "DROP TABLE IF EXISTS reddit_posts; DROP TABLE IF EXISTS reddit_stats; DROP TABLE IF EXISTS reddit_comments;",
+            "DROP TABLE IF EXISTS reddit_posts; DROP TABLE IF EXISTS reddit_stats; DROP TABLE IF EXISTS reddit_stats_agg; DROP TABLE IF EXISTS reddit_comments;",
         ]
         subprocess.run(cmd_truncate)
 
+        # 3. Réinitialiser les watermarks, l'index de déduplication et l'activité apprise
+        for state_file in (
+            "extraction_checkpoint.json",
+            "seen_index.db",
+            "subreddit_activity.json",
+        ):
+            if os.path.exists(state_file):
+                os.remove(state_file)
+
         status.update(label="Nettoyage terminé ! (Tables supprimées)", state="complete")
         st.sidebar.success("Données et Tables supprimées.")
 
@@ -954,13 +967,16 @@ with tab1:
     if st.button("Lancer l'extraction"):
         with st.status("Exécution...") as status:
             # 1. Extraction locale
-            st.write("Extraction Reddit (Posts & Commentaires)...")
+            st.write("Extraction Reddit (Posts & Commentaires) et upload HDFS...")
             # On sépare par virgule et on enlève les espaces inutiles
             subs = [s.strip() for s in subreddits.split(",")]
             cmd = (
                 [sys.executable, "extraction_reddit.py", "--subreddits"]
                 + subs
                 + ["--limit", str(limit), "--comments_limit", str(comments_limit)]
+                + ["--workers", str(workers)]
+                # Upload HDFS en flux pendant l'extraction (posts et commentaires en parallèle)
+                + ["--upload", "--hdfs_dir", "/reddit_data"]
             )
             res_extract = subprocess.run(cmd, capture_output=True, text=True)
 
@@ -969,81 +985,31 @@ with tab1:
                 st.code(res_extract.stderr)
                 st.stop()
 
-            if not os.path.exists("posts.csv"):
-                st.error("Le fichier posts.csv n'a pas été généré.")
+            if not find_compressed("posts.csv"):
+                st.info("Aucun nouveau post depuis la dernière extraction.")
                 st.stop()
 
-            # 2. Upload HDFS (via Docker Exec)
-            st.write("Upload vers HDFS...")
-
-            # Créer dossier si existe pas
-            subprocess.run(
-                [
-                    DOCKER_CMD,
-                    "exec",
-                    "namenode",
-                    "hdfs",
-                    "dfs",
-                    "-mkdir",
-                    "-p",
-                    "/reddit_data",
-                ]
-            )
-
-            # Upload Posts
-            cmd_copy_posts = [DOCKER_CMD, "cp", "posts.csv", "namenode:/tmp/posts.csv"]
-            subprocess.run(cmd_copy_posts)
-            cmd_hdfs_posts = [
-                DOCKER_CMD,
-                "exec",
-                "namenode",
-                "hdfs",
-                "dfs",
-                "-put",
-                "-f",
-                "/tmp/posts.csv",
-                "/reddit_data/",
-            ]
-            subprocess.run(cmd_hdfs_posts)
-
-            # Upload Comments (si existe)
-            if os.path.exists("comments.csv"):
-                cmd_copy_coms = [
-                    DOCKER_CMD,
-                    "cp",
-                    "comments.csv",
-                    "namenode:/tmp/comments.csv",
-                ]
-                subprocess.run(cmd_copy_coms)
-                cmd_hdfs_coms = [
-                    DOCKER_CMD,
-                    "exec",
-                    "namenode",
-                    "hdfs",
-                    "dfs",
-                    "-put",
-                    "-f",
-                    "/tmp/comments.csv",
-                    "/reddit_data/",
-                ]
-                subprocess.run(cmd_hdfs_coms)
-
             status.update(label="Succès !", state="complete")
             st.session_state["extraction_done"] = True
 
     # Affichage Persistant
     if st.session_state["extraction_done"]:
-        st.success("Données sur HDFS (/reddit_data/posts.csv & comments.csv)")
+        st.success(
+            "Run publié sur HDFS (/reddit_data/posts|comments/ingest_date=.../run_id=...)"
+        )
 
         col1, col2 = st.columns(2)
         with col1:
             st.subheader("Aperçu Posts")
-            if os.path.exists("posts.csv"):
-                st.dataframe(pd.read_csv("posts.csv"))
+            # posts.csv, posts.csv.gz ou posts.csv.zst selon --compression
+            posts_path = find_compressed("posts.csv")
+            if posts_path:
+                st.dataframe(pd.read_csv(posts_path))
         with col2:
             st.subheader("Aperçu Commentaires")
-            if os.path.exists("comments.csv"):
-                st.dataframe(pd.read_csv("comments.csv"))
+            comments_path = find_compressed("comments.csv")
+            if comments_path:
+                st.dataframe(pd.read_csv(comments_path))
 
 # 2. SPARK
 with tab2:
@@ -1055,6 +1021,8 @@ with tab2:
     if st.button("Lancer Job Spark"):
         with st.spinner("Traitement Spark en cours..."):
             # 0. Installation des dépendances NLP dans le conteneur
+            # (pandas et pyarrow : UDF de sentiment vectorisée par batches Arrow ;
+            # psycopg2 : chargement PostgreSQL par COPY)
             st.write("Installation de TextBlob (NLP) dans le conteneur Spark...")
             subprocess.run(
                 [
@@ -1066,6 +1034,9 @@ with tab2:
                     "pip",
                     "install",
                     "textblob",
+                    "pandas",
+                    "pyarrow",
+                    "psycopg2-binary",
                 ]
             )
 
@@ -1756,7 +1727,7 @@ with tab4:
             if api_key_input:
                 st.session_state.gemini_api_key = api_key_input
 
-        if st.session_state.gemini_api_key and os.path.exists("posts.csv"):
+        if st.session_state.gemini_api_key and find_compressed("posts.csv"):
             genai.configure(api_key=st.session_state.gemini_api_key)
 
             # Chat History Init
@@ -1800,7 +1771,7 @@ with tab4:
                         )
 
             # Data Context Loading
-            df = pd.read_csv("posts.csv")
+            df = pd.read_csv(find_compressed("posts.csv"))
             # On augmente un peu le contexte
             sample_df = df.groupby("subreddit").head(15)
             # On inclut num_comments si dispo
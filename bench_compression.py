@@ -0,0 +1,118 @@
+"""Benchmark des codecs de compression sur les CSV extraits : taux de
+compression, débit d'encodage et de décodage.
+
+Les données sont encodées comme dans l'extracteur, bloc par bloc (un membre
+gzip / une trame zstd par bloc de --chunk_size lignes).
+
+Usage :
+    python bench_compression.py posts.csv comments.csv
+    python bench_compression.py --synthetic 10 --limit 500
+"""
+
+import argparse
+import time
+
+import pandas as pd
+
+from extraction_reddit import CHUNK_SIZE, extract_reddit_data
+from rate_limiter import RateLimiter
+from reddit_replay import SyntheticReddit
+from stream_codecs import ZSTD_AVAILABLE, ChunkEncoder, decode, find_compressed
+
+# (codec, niveau) comparés ; None = niveau par défaut de l'extracteur
+CANDIDATES = [
+    ("none", None),
+    ("gzip", 1),
+    ("gzip", None),
+    ("gzip", 9),
+    ("zstd", 1),
+    ("zstd", None),
+    ("zstd", 9),
+    ("zstd", 19),
+]
+
+
+def load_chunks(paths, chunk_size):
+    """Blocs CSV (octets) tels que les écrit ChunkedCsvWriter."""
+    chunks = []
+    for path in paths:
+        df = pd.read_csv(find_compressed(path) or path)
+        for start in range(0, len(df), chunk_size):
+            part = df.iloc[start : start + chunk_size]
+            chunks.append(part.to_csv(header=start == 0, index=False).encode("utf-8"))
+    return chunks
+
+
+def synthetic_chunks(subreddits, limit, chunk_size):
+    """Posts et commentaires du client simulé, découpés comme load_chunks."""
+    subs = SyntheticReddit(subreddits).subreddits()
+    frames = extract_reddit_data(
+        subs,
+        limit,
+        5,
+        client_factory=lambda: SyntheticReddit(subreddits, limit, 5),
+        budget=RateLimiter(requests_per_minute=0),
+    )
+    return [
+        df.iloc[i : i + chunk_size].to_csv(header=i == 0, index=False).encode("utf-8")
+        for df in frames
+        for i in range(0, len(df), chunk_size)
+    ]
+
+
+def bench(chunks, codec, level, repeat):
+    encoder = ChunkEncoder(codec, level)
+    raw_size = sum(len(c) for c in chunks)
+    encode_time = decode_time = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = b"".join(encoder.encode(c) for c in chunks)
+        encode_time = min(encode_time, time.perf_counter() - start)
+        start = time.perf_counter()
+        decoded = decode(data, codec)
+        decode_time = min(decode_time, time.perf_counter() - start)
+    assert decoded == b"".join(chunks)
+    return {
+        "codec": codec,
+        "niveau": encoder.level if codec != "none" else "-",
+        "taux": raw_size / len(data),
+        "Mo": len(data) / 1e6,
+        "encodage Mo/s": raw_size / 1e6 / max(encode_time, 1e-9),
+        "décodage Mo/s": raw_size / 1e6 / max(decode_time, 1e-9),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        default=["posts.csv", "comments.csv"],
+        help="CSV extraits (compressés ou non)",
+    )
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=0,
+        help="Subreddits simulés (--limit posts chacun) à la place des fichiers",
+    )
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--chunk_size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        chunks = synthetic_chunks(args.synthetic, args.limit, args.chunk_size)
+    else:
+        chunks = load_chunks(args.paths, args.chunk_size)
+    raw_size = sum(len(c) for c in chunks)
+    print(f"{len(chunks)} bloc(s), {raw_size / 1e6:.1f} Mo de CSV brut")
+
+    results = [
+        bench(chunks, codec, level, args.repeat)
+        for codec, level in CANDIDATES
+        if codec != "zstd" or ZSTD_AVAILABLE
+    ]
+    if not ZSTD_AVAILABLE:
+        print("zstandard non installé : zstd ignoré")
+    print(pd.DataFrame(results).to_string(index=False, float_format="%.2f"))
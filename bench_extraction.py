@@ -0,0 +1,69 @@
+"""Benchmark de l'extraction séquentielle vs concurrente sur un client Reddit simulé.
+
+Usage :
+    python bench_extraction.py --subreddits 8 --limit 20 --latency 0.05 --workers 8
+    python bench_extraction.py --replay cassettes --latency 0.2 --workers 8
+"""
+
+import argparse
+import time
+
+from extraction_reddit import extract_reddit_data
+from rate_limiter import RateLimiter
+from reddit_replay import ReplayReddit, SyntheticReddit
+
+
+def run(client_factory, subreddits, limit, comments_limit, workers):
+    start = time.perf_counter()
+    df_posts, df_comments = extract_reddit_data(
+        subreddits,
+        limit,
+        comments_limit,
+        workers=workers,
+        client_factory=client_factory,
+        budget=RateLimiter(requests_per_minute=0),
+    )
+    return time.perf_counter() - start, len(df_posts), len(df_comments)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subreddits", type=int, default=8)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--comments_limit", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument(
+        "--replay",
+        help="Dossier enregistré par reddit_replay.py (sinon données synthétiques)",
+    )
+    args = parser.parse_args()
+
+    if args.replay:
+        subs = ReplayReddit(args.replay).subreddits()
+
+        def client_factory():
+            return ReplayReddit(args.replay, args.latency, args.jitter, seed=0)
+
+    else:
+        subs = SyntheticReddit(args.subreddits).subreddits()
+
+        def client_factory():
+            return SyntheticReddit(
+                args.subreddits, args.limit, latency=args.latency, jitter=args.jitter
+            )
+
+    t_seq, n_posts, n_comments = run(
+        client_factory, subs, args.limit, args.comments_limit, 1
+    )
+    t_par, _, _ = run(
+        client_factory, subs, args.limit, args.comments_limit, args.workers
+    )
+
+    print(f"Posts : {n_posts} | Commentaires : {n_comments}")
+    print(f"Séquentiel           : {t_seq:.2f}s ({n_posts / t_seq:.0f} posts/s)")
+    print(
+        f"Concurrent ({args.workers} threads) : {t_par:.2f}s ({n_posts / t_par:.0f} posts/s)"
+    )
+    print(f"Accélération         : x{t_seq / t_par:.1f}")
@@ -0,0 +1,73 @@
+"""Mémoire des enregistrements extraits : liste de dicts vs ColumnBuilder.
+
+Usage :
+    python bench_memory.py --subreddits 20 --limit 1000 --comments 10
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import pandas as pd
+
+from column_builder import ColumnBuilder
+from extraction_reddit import COMMENT_TYPES, POST_TYPES, iter_reddit_records
+from rate_limiter import RateLimiter
+from reddit_replay import SyntheticReddit
+
+
+def measure(subs, client_factory, limit, comments, collect, to_frames):
+    tracemalloc.start()
+    start = time.perf_counter()
+    stores = collect()
+    for event in iter_reddit_records(
+        subs,
+        limit,
+        comments,
+        client_factory=client_factory,
+        budget=RateLimiter(requests_per_minute=0),
+    ):
+        if event[0] in stores:
+            stores[event[0]].append(event[1])
+    frames = to_frames(stores)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, sum(len(df) for df in frames)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subreddits", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--comments", type=int, default=10)
+    args = parser.parse_args()
+
+    subs = SyntheticReddit(args.subreddits).subreddits()
+
+    def client_factory():
+        return SyntheticReddit(args.subreddits, args.limit, args.comments)
+
+    results = {
+        "Liste de dicts": measure(
+            subs,
+            client_factory,
+            args.limit,
+            args.comments,
+            lambda: {"post": [], "comment": []},
+            lambda s: (pd.DataFrame(s["post"]), pd.DataFrame(s["comment"])),
+        ),
+        "ColumnBuilder": measure(
+            subs,
+            client_factory,
+            args.limit,
+            args.comments,
+            lambda: {
+                "post": ColumnBuilder(POST_TYPES),
+                "comment": ColumnBuilder(COMMENT_TYPES),
+            },
+            lambda s: (s["post"].to_pandas(), s["comment"].to_pandas()),
+        ),
+    }
+    for name, (elapsed, peak, rows) in results.items():
+        print(f"{name:15s}: pic {peak / 1e6:7.1f} Mo | {elapsed:.2f}s | {rows} lignes")
@@ -0,0 +1,63 @@
+"""Débit de l'extraction répartie selon le nombre de shards (un jeu
+d'identifiants simulé par shard, chacun limité à --requests_per_minute).
+
+Usage :
+    python bench_shards.py --subreddits 16 --limit 200 --requests_per_minute 600 --shards 1 2 4
+"""
+
+import argparse
+import functools
+import time
+
+from extraction_reddit import CommentPolicy, iter_sharded_records
+from reddit_replay import SyntheticReddit
+
+
+def run(shards, subreddits, limit, comments_limit, requests_per_minute, latency):
+    client_factory = functools.partial(
+        SyntheticReddit, subreddits, limit, comments_limit, latency
+    )
+    start = time.perf_counter()
+    rows = 0
+    for event in iter_sharded_records(
+        client_factory().subreddits(),
+        limit,
+        [client_factory] * shards,
+        requests_per_minute=requests_per_minute,
+        comment_policy=CommentPolicy(comments_limit),
+    ):
+        if event[0] in ("post", "comment"):
+            rows += 1
+    return time.perf_counter() - start, rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subreddits", type=int, default=16)
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--comments_limit", type=int, default=0)
+    parser.add_argument(
+        "--requests_per_minute",
+        type=int,
+        default=600,
+        help="Quota simulé de chaque jeu d'identifiants",
+    )
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    baseline = None
+    for shards in args.shards:
+        elapsed, rows = run(
+            shards,
+            args.subreddits,
+            args.limit,
+            args.comments_limit,
+            args.requests_per_minute,
+            args.latency,
+        )
+        baseline = baseline or rows / elapsed / shards
+        print(
+            f"{shards} shard(s) : {elapsed:.1f}s | {rows / elapsed:.0f} lignes/s | "
+            f"efficacité {rows / elapsed / (shards * baseline):.0%}"
+        )
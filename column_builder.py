@@ -0,0 +1,88 @@
+"""Accumulation d'enregistrements en colonnes typées plutôt qu'en listes de dicts.
+
+Un dict par post répète ses neuf clés et pèse plusieurs fois la taille des
+données ; ici chaque colonne est une seule liste (texte) ou un array.array
+(nombres, 8 octets par valeur sans objet Python). Les colonnes numériques
+passent vers Arrow (et numpy) sans copie.
+"""
+
+from array import array
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Types Arrow stockés dans un array.array : code du tableau, dtype numpy
+ARRAY_TYPES = {"int64": ("q", np.int64), "double": ("d", np.float64)}
+
+
+class ColumnBuilder:
+    """Colonnes d'enregistrements ({nom: alias de type Arrow}) remplies ligne à
+    ligne par append(). Après to_arrow() / to_pandas(), qui partagent la mémoire
+    des colonnes numériques, le builder doit être vidé par clear() avant toute
+    nouvelle ligne."""
+
+    __slots__ = ("column_types", "columns", "num_rows")
+
+    def __init__(self, column_types):
+        self.column_types = dict(column_types)
+        self.clear()
+
+    def clear(self):
+        self.columns = {
+            name: array(ARRAY_TYPES[alias][0]) if alias in ARRAY_TYPES else []
+            for name, alias in self.column_types.items()
+        }
+        self.num_rows = 0
+
+    def __len__(self):
+        return self.num_rows
+
+    def append(self, record):
+        for name, values in self.columns.items():
+            value = record.get(name)
+            try:
+                values.append(value)
+            except TypeError:
+                # Valeur manquante dans une colonne numérique : repli sur une liste
+                values = self.columns[name] = list(values)
+                values.append(value)
+        self.num_rows += 1
+
+    def to_arrow(self):
+        if not PYARROW_AVAILABLE:
+            raise ImportError("pyarrow est requis pour la conversion Arrow")
+        arrays = []
+        for name, values in self.columns.items():
+            arrow_type = pa.type_for_alias(self.column_types[name])
+            if isinstance(values, array):
+                # Zéro copie : Arrow référence directement le tampon de l'array.array
+                arrays.append(
+                    pa.Array.from_buffers(
+                        arrow_type, len(values), [None, pa.py_buffer(values)]
+                    )
+                )
+            else:
+                arrays.append(pa.array(values, type=arrow_type))
+        return pa.Table.from_arrays(arrays, names=list(self.columns))
+
+    def to_pandas(self):
+        if PYARROW_AVAILABLE:
+            # split_blocks : les colonnes numériques restent des vues sur Arrow
+            return self.to_arrow().to_pandas(split_blocks=True)
+        return pd.DataFrame(
+            {
+                name: (
+                    np.frombuffer(values, dtype=ARRAY_TYPES[self.column_types[name]][1])
+                    if isinstance(values, array)
+                    else values
+                )
+                for name, values in self.columns.items()
+            }
+        )
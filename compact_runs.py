@@ -0,0 +1,213 @@
+"""Compaction des petits fichiers de la zone brute HDFS.
+
+Les runs d'une même journée d'ingestion (micro-batches du daemon, runs CSV)
+sont fusionnés en un seul run Parquet, partitionné par subreddit et date, avec
+des fichiers d'environ --target_mb Mo. Le manifeste bascule atomiquement : le
+run compacté est publié en une seule opération (renommage HDFS) et masque les
+runs qu'il remplace (compacted_from), supprimés ensuite.
+
+Usage : spark-submit compact_runs.py hdfs://namenode:9000/reddit_data --target_mb 128
+"""
+
+import argparse
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse
+
+from pyspark import StorageLevel
+from pyspark.sql.functions import col, expr
+
+from spark_processor import (
+    CORRUPT_COLUMN,
+    RAW_SCHEMAS,
+    RUNS_MANIFEST_DIR,
+    SOURCE_FILE_COLUMN,
+    count_rows,
+    is_processed,
+    list_runs,
+    path_exists,
+    processed_runs,
+    quarantine,
+    read_runs,
+    record_processed,
+    spark,
+    write_json,
+)
+
+TARGET_FILE_MB = 128
+
+
+def _fs_path(path):
+    jvm_path = spark._jvm.org.apache.hadoop.fs.Path(path)
+    return jvm_path.getFileSystem(spark._jsc.hadoopConfiguration()), jvm_path
+
+
+def _size(path):
+    fs, jvm_path = _fs_path(path)
+    return fs.getContentSummary(jvm_path).getLength()
+
+
+def _run_path(hdfs_dir, name, run):
+    return f"{hdfs_dir}/{name}/ingest_date={run['ingest_date']}/run_id={run['run_id']}"
+
+
+def _compacted_run_id(last_run_id):
+    # Juste après le dernier run fusionné : « latest » garde le même sens
+    timestamp = datetime.strptime(last_run_id.split("Z-")[0], "%Y%m%dT%H%M%S%f")
+    next_timestamp = timestamp + timedelta(microseconds=1)
+    return f"{next_timestamp:%Y%m%dT%H%M%S%f}Z-c{uuid.uuid4().hex[:7]}"
+
+
+def plan_compaction(runs, include_today=False, min_runs=2, processed=frozenset()):
+    """Groupes de runs à fusionner, par jour d'ingestion : au moins min_runs
+    runs, ou un run CSV à réécrire en Parquet. La journée en cours, encore
+    alimentée, est ignorée sauf include_today.
+
+    Runs déjà traités par spark_processor (registre processed) et runs en
+    attente ne sont jamais fusionnés ensemble : le run compacté hérite de leur
+    état et n'est ni retraité ni oublié."""
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    groups = defaultdict(list)
+    for run in runs:
+        if include_today or run["ingest_date"] < today:
+            groups[(run["ingest_date"], is_processed(run, processed))].append(run)
+    return [
+        group
+        for group in groups.values()
+        if len(group) >= min_runs or any(r["format"] == "csv" for r in group)
+    ]
+
+
+def _read_typed(hdfs_dir, name, runs):
+    paths = [
+        _run_path(hdfs_dir, name, r)
+        for r in runs
+        if path_exists(_run_path(hdfs_dir, name, r))
+    ]
+    if not paths:
+        return None, 0
+    return read_runs(hdfs_dir, name, runs), sum(_size(p) for p in paths)
+
+
+def compact_group(
+    hdfs_dir, runs, target_mb=TARGET_FILE_MB, keep_sources=False, processed=False
+):
+    run_id = _compacted_run_id(runs[-1]["run_id"])
+    compacted = {"run_id": run_id, "ingest_date": runs[0]["ingest_date"]}
+    rows = {}
+    for name in RAW_SCHEMAS:
+        df, input_bytes = _read_typed(hdfs_dir, name, runs)
+        if df is None:
+            continue
+        # Lu une fois : comptage, quarantaine des lignes mal formées et réécriture
+        cached = df.persist(StorageLevel.MEMORY_AND_DISK)
+        counts = count_rows({name: cached})
+        rows[name] = counts[(name, False)]
+        if counts[(name, True)]:
+            # Les runs sources seront supprimés : les lignes écartées sont conservées
+            path = quarantine(cached, f"{hdfs_dir}/_quarantine", name)
+            print(f"{name} : {counts[(name, True)]} ligne(s) mal formée(s) -> {path}")
+        df = cached.where(col(CORRUPT_COLUMN).isNull()).drop(
+            CORRUPT_COLUMN, SOURCE_FILE_COLUMN
+        )
+        # Lignes par fichier pour viser target_mb (taille moyenne d'une ligne en entrée)
+        rows_per_file = max(
+            1, int(rows[name] * target_mb * 1024 * 1024 / max(1, input_bytes))
+        )
+        tmp_path = f"{hdfs_dir}/{name}/_compacting/{run_id}"
+        (
+            df.withColumn(
+                "date",
+                expr("date_format(timestamp_seconds(created_utc), 'yyyy-MM-dd')"),
+            )
+            # Une tâche par partition subreddit/date : pas de fichiers fragmentés
+            .repartition("subreddit", "date")
+            .write.option("maxRecordsPerFile", rows_per_file)
+            .option("compression", "snappy")
+            .partitionBy("subreddit", "date")
+            .mode("overwrite")
+            .parquet(tmp_path)
+        )
+        cached.unpersist()
+        fs, src = _fs_path(tmp_path)
+        _, dst = _fs_path(_run_path(hdfs_dir, name, compacted))
+        if not fs.rename(src, dst):
+            raise IOError(f"Renommage impossible : {tmp_path}")
+        print(f"{name} : {len(runs)} run(s), {input_bytes / 1e6:.1f} Mo -> {dst}")
+
+    if not rows:
+        return None
+    entry = {
+        **compacted,
+        "format": "parquet",
+        "rows": rows,
+        "paths": {
+            name: urlparse(_run_path(hdfs_dir, name, compacted)).path for name in rows
+        },
+        "published_at": datetime.now(timezone.utc).isoformat(),
+        "mode": "compaction",
+        "compacted_from": [r["run_id"] for r in runs],
+    }
+    if processed:
+        # Inscrit au registre avant d'être visible : jamais retraité par spark_processor
+        record_processed(hdfs_dir, [entry], rows, mode="compaction")
+    # Bascule du manifeste : fichier caché écrit puis renommé (opération atomique)
+    manifest_dir = f"{hdfs_dir}/{RUNS_MANIFEST_DIR}"
+    write_json(f"{manifest_dir}/{run_id}.json", entry)
+
+    if not keep_sources:
+        # Les runs remplacés sont déjà masqués : leur suppression peut échouer sans risque
+        for run in runs:
+            for path in [
+                f"{manifest_dir}/{run['run_id']}.json",
+                *(_run_path(hdfs_dir, name, run) for name in RAW_SCHEMAS),
+            ]:
+                fs, jvm_path = _fs_path(path)
+                fs.delete(jvm_path, True)
+    return entry
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(usage="compact_runs.py <hdfs_directory>")
+    parser.add_argument("hdfs_dir")
+    parser.add_argument(
+        "--target_mb", type=int, default=TARGET_FILE_MB, help="Taille visée par fichier"
+    )
+    parser.add_argument(
+        "--min_runs",
+        type=int,
+        default=2,
+        help="Runs minimum pour fusionner une journée",
+    )
+    parser.add_argument(
+        "--include_today",
+        action="store_true",
+        help="Compacte aussi la journée d'ingestion en cours",
+    )
+    parser.add_argument(
+        "--keep_sources",
+        action="store_true",
+        help="Conserve les runs fusionnés (masqués du manifeste)",
+    )
+    args = parser.parse_args()
+
+    # Dates de partition calculées en UTC, comme dans l'extracteur
+    spark.conf.set("spark.sql.session.timeZone", "UTC")
+
+    runs = list_runs(args.hdfs_dir)
+    if not runs:
+        print("Aucun manifeste de runs : rien à compacter.")
+    else:
+        processed = processed_runs(args.hdfs_dir)
+        groups = plan_compaction(runs, args.include_today, args.min_runs, processed)
+        print(f"{len(groups)} groupe(s) à compacter sur {len(runs)} runs publiés")
+        for group in groups:
+            compact_group(
+                args.hdfs_dir,
+                group,
+                args.target_mb,
+                args.keep_sources,
+                processed=is_processed(group[0], processed),
+            )
+    spark.stop()
@@ -1,95 +1,1490 @@
 import praw
-import pandas as pd
 import argparse
+import functools
+import itertools
+import json
+import multiprocessing
 import os
- # import inutilisé supprimé
+import queue
+import shutil
+import signal
+import threading
+import time
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+from activity_scheduler import ACTIVITY_PATH, ActivityScheduler
+from column_builder import ColumnBuilder
+from hdfs_writer import HdfsUploader, hdfs_put, new_run_id
+from rate_limiter import REQUESTS_PER_MINUTE, RateLimiter
+from seen_index import SEEN_INDEX_PATH, SeenIndex
+from stream_codecs import (
+    COMPRESSION,
+    EXTENSIONS,
+    ChunkEncoder,
+    codec_variants,
+    compressed_path,
+)
+
+try:
+    import pyarrow.parquet as pq
+
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
 
 # Configuration Reddit (Récupérée depuis votre ancien script)
 CLIENT_ID = os.getenv("REDDIT_CLIENT_ID", "your_client_id")
 CLIENT_SECRET = os.getenv("REDDIT_CLIENT_SECRET", "your_client_secret")
 USER_AGENT = os.getenv("REDDIT_USER_AGENT", "RedditSentimentAnalytics/1.0")
 
+# Taille d'une page de listing Reddit (une requête HTTP par page)
+LISTING_PAGE_SIZE = 100
+# Reddit ne pagine pas un listing au-delà de 1000 éléments
+LISTING_MAX_ITEMS = 1000
 
-def extract_reddit_data(subreddits, limit=100, comments_limit=5):
-    try:
-        reddit = praw.Reddit(
-            client_id=CLIENT_ID, client_secret=CLIENT_SECRET, user_agent=USER_AGENT
+CHECKPOINT_PATH = os.getenv("EXTRACTION_CHECKPOINT", "extraction_checkpoint.json")
+
+# Nombre de lignes accumulées en mémoire avant écriture sur disque
+CHUNK_SIZE = 1000
+
+# Colonnes et types Arrow des fichiers extraits
+POST_TYPES = {
+    "id": "string",
+    "title": "string",
+    "body": "string",
+    "score": "int64",
+    "author": "string",
+    "created_utc": "double",
+    "subreddit": "string",
+    "url": "string",
+    "num_comments": "int64",
+}
+COMMENT_TYPES = {
+    "id": "string",
+    "post_id": "string",
+    "body": "string",
+    "author": "string",
+    "score": "int64",
+    "created_utc": "double",
+    "subreddit": "string",
+}
+POST_COLUMNS = list(POST_TYPES)
+COMMENT_COLUMNS = list(COMMENT_TYPES)
+
+
+class PendingRunError(RuntimeError):
+    pass
+
+
+class CheckpointStore:
+    """Watermark (created_utc, id) du post (et du commentaire, en mode daemon)
+    le plus récent vu par subreddit, et liste des subreddits terminés du run en
+    cours pour pouvoir le reprendre."""
+
+    def __init__(self, path=CHECKPOINT_PATH):
+        self.path = path
+        self.state = {"subreddits": {}, "comments": {}, "pending_run": None}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.state.update(json.load(f))
+
+    def watermark(self, sub_name, kind="posts"):
+        store = self.state["subreddits"] if kind == "posts" else self.state["comments"]
+        return store.get(sub_name)
+
+    def start_run(self, subreddits, run_id=None):
+        """Retourne (subreddits restant à extraire, True si reprise d'un run interrompu).
+        Une reprise garde le run_id du run interrompu (voir la propriété run_id).
+
+        Un run interrompu sur d'autres subreddits n'est jamais abandonné : ses
+        subreddits terminés ont déjà leurs watermarks et leurs ids validés, et
+        ses fichiers locaux non publiés seraient effacés par le nouveau run."""
+        pending = self.state["pending_run"]
+        if pending and sorted(pending["subreddits"]) == sorted(subreddits):
+            remaining = [s for s in subreddits if s not in pending["completed"]]
+            return remaining, True
+        if pending:
+            raise PendingRunError(
+                f"Run {pending.get('run_id')} interrompu et non publié sur "
+                f"{' '.join(pending['subreddits'])} : relancez avec ces subreddits "
+                "pour le terminer avant d'en extraire d'autres"
+            )
+        self.state["pending_run"] = {
+            "subreddits": list(subreddits),
+            "completed": [],
+            "run_id": run_id,
+        }
+        self.save()
+        return list(subreddits), False
+
+    @property
+    def run_id(self):
+        return (self.state["pending_run"] or {}).get("run_id")
+
+    def complete_subreddit(self, sub_name, newest, newest_comment=None):
+        """newest / newest_comment : {"created_utc", "id"} du post / commentaire
+        le plus récent extrait, ou None."""
+        if newest:
+            self.state["subreddits"][sub_name] = newest
+        if newest_comment:
+            self.state["comments"][sub_name] = newest_comment
+        pending = self.state["pending_run"]
+        # Daemon : mêmes subreddits à chaque poll, la liste reste bornée
+        if (
+            pending
+            and sub_name in pending["subreddits"]
+            and sub_name not in pending["completed"]
+        ):
+            pending["completed"].append(sub_name)
+        self.save()
+
+    def finish_run(self):
+        self.state["pending_run"] = None
+        self.save()
+
+    def save(self):
+        # Écriture atomique : un crash ne laisse jamais un checkpoint tronqué
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+
+def _reached_watermark(item, watermark):
+    # subreddit.new() et subreddit.comments() sont triés du plus récent au plus ancien
+    if watermark is None:
+        return False
+    return item.id == watermark["id"] or item.created_utc < watermark["created_utc"]
+
+
+def _newer(newest, record):
+    if newest is None or record["created_utc"] > newest["created_utc"]:
+        return {"created_utc": record["created_utc"], "id": record["id"]}
+    return newest
+
+
+def load_credentials():
+    """Jeux d'identifiants OAuth de l'environnement : REDDIT_CLIENT_ID /
+    REDDIT_CLIENT_SECRET, puis REDDIT_CLIENT_ID_2 / REDDIT_CLIENT_SECRET_2, etc.
+    (REDDIT_USER_AGENT_<n> facultatif). Chaque app OAuth a son propre quota."""
+    credentials = [
+        {
+            "client_id": CLIENT_ID,
+            "client_secret": CLIENT_SECRET,
+            "user_agent": USER_AGENT,
+        }
+    ]
+    for n in itertools.count(2):
+        client_id = os.getenv(f"REDDIT_CLIENT_ID_{n}")
+        if not client_id:
+            return credentials
+        credentials.append(
+            {
+                "client_id": client_id,
+                "client_secret": os.getenv(f"REDDIT_CLIENT_SECRET_{n}", ""),
+                "user_agent": os.getenv(f"REDDIT_USER_AGENT_{n}", USER_AGENT),
+            }
+        )
+
+
+def create_reddit_client(credentials=None):
+    if credentials is None:
+        credentials = load_credentials()[0]
+    return praw.Reddit(**credentials)
+
+
+def _thread_client_getter(client_factory):
+    # praw n'est pas thread-safe : un client par thread, même app OAuth
+    local = threading.local()
+
+    def get_client():
+        if not hasattr(local, "client"):
+            local.client = client_factory()
+        return local.client
+
+    return get_client
+
+
+class ClientPool:
+    """Fabrique de clients praw réutilisés d'un appel à l'autre : chaque thread
+    actif garde le sien, et le rend au pool quand il se termine (évite une
+    nouvelle authentification OAuth à chaque poll du daemon)."""
+
+    class _Lease:
+        def __init__(self, client):
+            self.client = client
+
+    def __init__(self, client_factory=None):
+        self._factory = client_factory or create_reddit_client
+        self._free = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _release(self, client):
+        with self._lock:
+            self._free.append(client)
+
+    def __call__(self):
+        lease = getattr(self._local, "lease", None)
+        if lease is None:
+            with self._lock:
+                client = self._free.pop() if self._free else None
+            lease = self._Lease(client or self._factory())
+            # Le thread-local est libéré à la fin du thread : le client revient au pool
+            weakref.finalize(lease, self._release, lease.client)
+            self._local.lease = lease
+        return lease.client
+
+
+_END = object()
+
+
+def _paged(listing, budget, client):
+    """Parcourt un listing praw sous le rate limiter : chaque chargement de page
+    consomme un jeton et est rejoué en cas d'erreur transitoire (le générateur
+    de praw reste positionné sur la page en échec)."""
+    iterator = iter(listing)
+    for i in itertools.count():
+        item = budget.call(
+            next,
+            iterator,
+            _END,
+            acquire=i % LISTING_PAGE_SIZE == 0,
+            client=client,
         )
+        if item is _END:
+            return
+        yield item
+
+
+def _iter_listing(client, sub_name, limit, budget, watermark=None):
+    subreddit = client.subreddit(sub_name)
+    for post in _paged(subreddit.new(limit=limit), budget, client):
+        if _reached_watermark(post, watermark):
+            break  # Le reste du listing a déjà été extrait : on arrête la pagination
+        yield {
+            "id": post.id,
+            "title": post.title,
+            "body": post.selftext,
+            "score": post.score,
+            "author": str(post.author),
+            "created_utc": post.created_utc,
+            "subreddit": sub_name,
+            "url": post.url,
+            "num_comments": post.num_comments,
+        }
+
+
+def _iter_subreddit_comments(client, sub_name, limit, budget, watermark=None):
+    # Derniers commentaires de tout le subreddit : une requête pour 100 commentaires
+    subreddit = client.subreddit(sub_name)
+    for comment in _paged(subreddit.comments(limit=limit), budget, client):
+        if _reached_watermark(comment, watermark):
+            break
+        yield {
+            "id": comment.id,
+            "post_id": comment.link_id.split("_", 1)[-1],
+            "body": comment.body,
+            "author": str(comment.author),
+            "score": comment.score,
+            "created_utc": comment.created_utc,
+            "subreddit": sub_name,
+        }
 
-        all_posts = []
-        all_comments = []
 
+# Commentaires demandés par limite de CommentPolicy quand la profondeur est
+# filtrée localement ; Reddit plafonne un arbre à 500 commentaires
+COMMENT_TREE_OVERFETCH = 10
+COMMENT_TREE_MAX = 500
+
+
+class CommentPolicy:
+    """Stratégie de récupération des commentaires : les `limit` meilleurs
+    commentaires (tri `sort`, profondeur <= `max_depth`) des seuls posts
+    qui en valent la requête."""
+
+    def __init__(
+        self, limit=5, sort="top", max_depth=0, min_post_score=None, min_post_comments=1
+    ):
+        self.limit = limit
+        self.sort = sort
+        self.max_depth = max_depth
+        self.min_post_score = min_post_score
+        self.min_post_comments = max(1, min_post_comments)
+
+    def wants(self, post):
+        # Décidé sur les métadonnées du listing, avant toute requête
+        if self.limit <= 0 or post["num_comments"] < self.min_post_comments:
+            return False
+        return self.min_post_score is None or post["score"] >= self.min_post_score
+
+
+def _fetch_comments(client, post_id, sub_name, policy, budget):
+    comments = []
+    submission = client.submission(id=post_id)
+    # Tri et limite envoyés à l'API : Reddit ne renvoie que les meilleurs commentaires
+    submission.comment_sort = policy.sort
+    submission.comment_limit = policy.limit
+    if policy.max_depth is not None:
+        # La limite porte sur tout l'arbre, réponses comprises : on en demande
+        # plus avant de filtrer la profondeur puis de couper à policy.limit
+        submission.comment_limit = min(
+            COMMENT_TREE_MAX, policy.limit * COMMENT_TREE_OVERFETCH
+        )
+    # Le premier accès à .comments charge l'arbre ; on ne charge pas les
+    # "load more comments" pour aller vite
+    budget.call(lambda: submission.comments.replace_more(limit=0), client=client)
+    candidates = [
+        c
+        for c in submission.comments.list()
+        if policy.max_depth is None or getattr(c, "depth", 0) <= policy.max_depth
+    ]
+    if policy.sort == "top":
+        candidates.sort(key=lambda c: c.score, reverse=True)
+    for comment in candidates[: policy.limit]:
+        comments.append(
+            {
+                "id": comment.id,
+                "post_id": post_id,
+                "body": comment.body,
+                "author": str(comment.author),
+                "score": comment.score,
+                "created_utc": comment.created_utc,
+                "subreddit": sub_name,
+            }
+        )
+    return comments
+
+
+class _Cancelled(Exception):
+    pass
+
+
+def iter_reddit_records(
+    subreddits,
+    limit=100,
+    comments_limit=5,
+    workers=1,
+    client_factory=create_reddit_client,
+    budget=None,
+    checkpoint=None,
+    comment_policy=None,
+    seen_index=None,
+    comment_stream=False,
+    scheduler=None,
+    comment_stream_limit=None,
+    follow_watermark=False,
+    report=True,
+):
+    """Générateur d'événements d'extraction, au fil de l'eau :
+
+    ("post", dict), ("comment", dict), puis ("done", sub_name, newest,
+    newest_comment) quand tous les posts et commentaires d'un subreddit ont été
+    émis, ou ("failed", sub_name) s'il a échoué. Les threads alimentent une file
+    bornée : la mémoire reste constante quelle que soit la limite.
+
+    comment_policy (CommentPolicy) remplace comments_limit s'il est fourni.
+    Avec un seen_index (SeenIndex), les posts et commentaires déjà ingérés lors
+    d'un run précédent ne sont pas émis. Avec comment_stream, les commentaires
+    viennent du flux de commentaires du subreddit (depuis leur watermark) au lieu
+    d'une requête par post.
+
+    limit peut être un dict {subreddit: limite} (ActivityScheduler.allocate_limits),
+    comme comment_stream_limit (commentaires du flux, par défaut limit). Le flux
+    de commentaires n'applique sa limite que sans watermark : sinon il est lu
+    jusqu'au watermark, dans le plafond des listings Reddit ; avec
+    follow_watermark (daemon), le listing des posts aussi. Avec un scheduler,
+    chaque listing complet est une observation de l'activité du subreddit.
+    report : affiche le bilan d'API du budget à la fin de l'extraction.
+    """
+    policy = comment_policy or CommentPolicy(comments_limit)
+    get_client = _thread_client_getter(client_factory)
+    get_client()  # Valide la configuration avant de lancer les threads
+    if budget is None:
+        budget = RateLimiter()
+    workers = max(1, workers)
+    events = queue.Queue(maxsize=CHUNK_SIZE)
+    stop = threading.Event()
+
+    def put(event):
+        while not stop.is_set():
+            try:
+                events.put(event, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+        raise _Cancelled()
+
+    def comments_task(post_id, sub_name):
+        try:
+            comments = _fetch_comments(get_client(), post_id, sub_name, policy, budget)
+        except Exception as e:
+            print(f"Erreur extraction commentaires post {post_id}: {e}")
+            budget.record_lost("arbres_commentaires")
+            return
+        for comment in comments:
+            put(("comment", comment))
+
+    def subreddit_task(sub_name, comments_pool):
+        print(f"Extraction depuis r/{sub_name}...")
+        watermark = checkpoint.watermark(sub_name) if checkpoint else None
+        sub_limit = limit[sub_name] if isinstance(limit, dict) else limit
+        # Limite atteinte avant le watermark : avancer le watermark au post le
+        # plus récent perdrait les posts entre les deux
+        post_limit = LISTING_MAX_ITEMS if follow_watermark and watermark else sub_limit
+        newest = None
+        newest_comment = None
+        count = 0
+        oldest_utc = None
+        comment_futures = []
+        try:
+            for post in _iter_listing(
+                get_client(), sub_name, post_limit, budget, watermark
+            ):
+                put(("post", post))
+                newest = _newer(newest, post)
+                count += 1
+                oldest_utc = post["created_utc"]
+                if not comment_stream and policy.wants(post):
+                    comment_futures.append(
+                        comments_pool.submit(comments_task, post["id"], sub_name)
+                    )
+            if scheduler:
+                scheduler.observe(
+                    sub_name,
+                    count,
+                    oldest_utc,
+                    truncated=post_limit is not None and count >= post_limit,
+                    since=watermark["created_utc"] if watermark else None,
+                )
+            if follow_watermark and watermark and count >= post_limit:
+                print(
+                    f"r/{sub_name} : watermark des posts au-delà des "
+                    f"{LISTING_MAX_ITEMS} derniers, posts intermédiaires perdus"
+                )
+                budget.record_lost("listings")
+            if comment_stream:
+                comment_watermark = (
+                    checkpoint.watermark(sub_name, "comments") if checkpoint else None
+                )
+                # Limite atteinte avant le watermark : avancer le watermark au
+                # commentaire le plus récent perdrait les commentaires entre
+                # les deux, on continue la pagination jusqu'au watermark
+                if comment_watermark:
+                    comment_limit = LISTING_MAX_ITEMS
+                elif isinstance(comment_stream_limit, dict):
+                    comment_limit = comment_stream_limit[sub_name]
+                else:
+                    comment_limit = comment_stream_limit or sub_limit
+                comment_count = 0
+                oldest_comment_utc = None
+                for comment in _iter_subreddit_comments(
+                    get_client(), sub_name, comment_limit, budget, comment_watermark
+                ):
+                    put(("comment", comment))
+                    newest_comment = _newer(newest_comment, comment)
+                    comment_count += 1
+                    oldest_comment_utc = comment["created_utc"]
+                if scheduler:
+                    scheduler.observe(
+                        sub_name,
+                        comment_count,
+                        oldest_comment_utc,
+                        truncated=comment_count >= comment_limit,
+                        since=(
+                            comment_watermark["created_utc"]
+                            if comment_watermark
+                            else None
+                        ),
+                        kind="comments",
+                    )
+                if comment_watermark and comment_count >= comment_limit:
+                    print(
+                        f"r/{sub_name} : watermark des commentaires au-delà des "
+                        f"{LISTING_MAX_ITEMS} derniers, commentaires intermédiaires perdus"
+                    )
+                    budget.record_lost("flux_commentaires")
+            wait(comment_futures)
+            put(("done", sub_name, newest, newest_comment))
+        except _Cancelled:
+            pass
+        except Exception as e:
+            if stop.is_set():
+                return
+            print(f"Erreur sur r/{sub_name}: {e}")
+            budget.record_lost("listings")
+            wait(comment_futures)
+            put(("failed", sub_name))
+
+    with ThreadPoolExecutor(
+        max_workers=min(workers, max(1, len(subreddits)))
+    ) as listing_pool, ThreadPoolExecutor(max_workers=workers) as comments_pool:
         for sub_name in subreddits:
-            print(f"Extraction depuis r/{sub_name}...")
+            listing_pool.submit(subreddit_task, sub_name, comments_pool)
+        try:
+            finished = 0
+            duplicates = 0
+            while finished < len(subreddits):
+                event = events.get()
+                if event[0] in ("done", "failed"):
+                    finished += 1
+                elif seen_index and not seen_index.check_and_add(
+                    event[0], event[1]["id"]
+                ):
+                    duplicates += 1
+                    continue
+                yield event
+        finally:
+            # Consommateur interrompu : on débloque les threads producteurs
+            stop.set()
+            listing_pool.shutdown(wait=False, cancel_futures=True)
+
+    if report:
+        print(budget.report())
+    if seen_index:
+        print(f"Doublons déjà ingérés ignorés : {duplicates}")
+
+
+# Événements regroupés par message entre un shard et le coordinateur
+SHARD_BATCH_SIZE = 500
+
+
+class _ShardWatermarks:
+    """Watermarks d'un subreddit transmis au shard (interface de CheckpointStore
+    utilisée par iter_reddit_records)."""
+
+    def __init__(self, posts=None, comments=None):
+        self._watermarks = {"posts": posts, "comments": comments}
+
+    def watermark(self, sub_name, kind="posts"):
+        return self._watermarks[kind]
+
+
+class _ShardScheduler:
+    """Relaie au coordinateur les observations d'activité faites dans un shard."""
+
+    def __init__(self, results):
+        self._results = results
+
+    def observe(self, *args, **kwargs):
+        self._results.put(("observe", args, kwargs))
+
+
+def _shard_worker(
+    shard,
+    client_factory,
+    tasks,
+    results,
+    requests_per_minute,
+    max_retries,
+    workers,
+    options,
+):
+    """Processus d'un shard : son propre client (ses identifiants) et son propre
+    budget API. workers threads prennent les subreddits un à un dans la file
+    commune jusqu'à la sentinelle None : jusqu'à workers listings en parallèle,
+    comme sans shards, et un shard qui termine tôt reprend le travail restant."""
+    budget = RateLimiter(requests_per_minute, max_retries=max_retries)
+    clients = ClientPool(client_factory)
+    scheduler = _ShardScheduler(results)
+
+    def extract():
+        for sub_name, sub_limit, watermarks in iter(tasks.get, None):
+            results.put(("started", shard, sub_name))
+            batch = []
+            for event in iter_reddit_records(
+                [sub_name],
+                sub_limit,
+                client_factory=clients,
+                budget=budget,
+                checkpoint=_ShardWatermarks(**watermarks),
+                scheduler=scheduler,
+                report=False,
+                **options,
+            ):
+                batch.append(event)
+                if len(batch) >= SHARD_BATCH_SIZE or event[0] in ("done", "failed"):
+                    results.put(("events", shard, batch))
+                    batch = []
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(extract) for _ in range(workers)]:
+            future.result()
+    results.put(("finished", shard, budget.report()))
+
+
+def iter_sharded_records(
+    subreddits,
+    limit=100,
+    client_factories=None,
+    requests_per_minute=REQUESTS_PER_MINUTE,
+    max_retries=5,
+    workers=1,
+    checkpoint=None,
+    comment_policy=None,
+    seen_index=None,
+    scheduler=None,
+):
+    """Même générateur d'événements que iter_reddit_records, réparti sur un
+    processus par client_factories (par défaut un par jeu d'identifiants de
+    load_credentials), chacun avec son quota de requests_per_minute.
+
+    Les subreddits sont distribués à la demande depuis une file commune, les
+    plus actifs d'abord (limite ou activité apprise) : la charge se rééquilibre
+    d'elle-même quand un shard termine tôt. Chaque shard garde jusqu'à workers
+    subreddits en cours, comme une extraction sans shards. Les événements reviennent au
+    processus appelant, qui écrit un seul run (writers, checkpoint, seen_index
+    et scheduler restent locaux). Un shard mort en cours de route rend son
+    subreddit en ("failed", sub_name)."""
+    if client_factories is None:
+        client_factories = [
+            functools.partial(create_reddit_client, credentials)
+            for credentials in load_credentials()
+        ]
+    shards = max(1, min(len(client_factories), len(subreddits)))
+
+    def sub_limit(sub_name):
+        return limit[sub_name] if isinstance(limit, dict) else limit
+
+    def expected_posts(sub_name):
+        backlog = scheduler.expected_backlog(sub_name) if scheduler else None
+        if backlog is None:
+            return sub_limit(sub_name) or 0
+        return min(backlog, sub_limit(sub_name) or backlog)
+
+    # spawn : pas de fork d'un processus qui a déjà des threads (uploads HDFS)
+    context = multiprocessing.get_context("spawn")
+    tasks = context.Queue()
+    results = context.Queue(maxsize=CHUNK_SIZE)
+    for sub_name in sorted(subreddits, key=expected_posts, reverse=True):
+        watermarks = {}
+        if checkpoint:
+            watermarks = {
+                "posts": checkpoint.watermark(sub_name),
+                "comments": checkpoint.watermark(sub_name, "comments"),
+            }
+        tasks.put((sub_name, sub_limit(sub_name), watermarks))
+    workers = max(1, workers)
+    # Une sentinelle par thread de chaque shard
+    for _ in range(shards * workers):
+        tasks.put(None)
+
+    options = {
+        # Un thread de commentaires par subreddit en cours : workers au total
+        "workers": 1,
+        "comment_policy": comment_policy or CommentPolicy(),
+    }
+    processes = [
+        context.Process(
+            target=_shard_worker,
+            args=(
+                shard,
+                client_factories[shard],
+                tasks,
+                results,
+                requests_per_minute,
+                max_retries,
+                workers,
+                options,
+            ),
+            daemon=True,
+        )
+        for shard in range(shards)
+    ]
+    for process in processes:
+        process.start()
+    print(f"Extraction répartie sur {shards} shard(s)")
+
+    pending = set(subreddits)
+    # Subreddits en cours par shard (jusqu'à workers chacun)
+    current = {shard: set() for shard in range(shards)}
+    try:
+        while pending:
             try:
-                subreddit = reddit.subreddit(sub_name)
-
-                for post in subreddit.new(limit=limit):
-                    # Extraction du Post
-                    all_posts.append(
-                        {
-                            "id": post.id,
-                            "title": post.title,
-                            "body": post.selftext,
-                            "score": post.score,
-                            "author": str(post.author),
-                            "created_utc": post.created_utc,
-                            "subreddit": sub_name,
-                            "url": post.url,
-                            "num_comments": post.num_comments,
-                        }
+                message = results.get(timeout=1.0)
+            except queue.Empty:
+                # File vide : les messages d'un shard mort ont tous été lus
+                alive = False
+                for shard, process in enumerate(processes):
+                    if process.is_alive():
+                        alive = True
+                    elif current[shard] & pending:
+                        print(f"Shard {shard} arrêté (code {process.exitcode})")
+                        for sub_name in sorted(current[shard] & pending):
+                            pending.discard(sub_name)
+                            yield ("failed", sub_name)
+                        current[shard].clear()
+                if not alive and pending:
+                    print(
+                        f"Shards arrêtés : {len(pending)} subreddit(s) non extrait(s)"
                     )
+                    for sub_name in sorted(pending):
+                        yield ("failed", sub_name)
+                    pending.clear()
+                continue
 
-                    # Extraction des Commentaires
-                    try:
-                        post.comments.replace_more(
-                            limit=0
-                        )  # On ne charge pas les "load more comments" pour aller vite
-                        for comment in post.comments.list()[:comments_limit]:
-                            all_comments.append(
-                                {
-                                    "id": comment.id,
-                                    "post_id": post.id,
-                                    "body": comment.body,
-                                    "author": str(comment.author),
-                                    "score": comment.score,
-                                    "created_utc": comment.created_utc,
-                                    "subreddit": sub_name,
-                                }
-                            )
-                    except Exception as e:
-                        print(f"Erreur extraction commentaires post {post.id}: {e}")
+            kind = message[0]
+            if kind == "started":
+                current[message[1]].add(message[2])
+            elif kind == "observe":
+                if scheduler:
+                    scheduler.observe(*message[1], **message[2])
+            elif kind == "finished":
+                print(f"Shard {message[1]} : {message[2]}")
+            else:
+                for event in message[2]:
+                    if event[0] in ("done", "failed"):
+                        pending.discard(event[1])
+                    elif seen_index and not seen_index.check_and_add(
+                        event[0], event[1]["id"]
+                    ):
+                        continue
+                    yield event
 
-            except Exception as e:
-                print(f"Erreur sur r/{sub_name}: {e}")
+        # Derniers messages des shards : leur bilan d'API
+        while any(process.is_alive() for process in processes):
+            try:
+                message = results.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            if message[0] == "finished":
+                print(f"Shard {message[1]} : {message[2]}")
+    finally:
+        # Consommateur interrompu : les shards encore actifs sont arrêtés
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+
+class ChunkedCsvWriter:
+    """Écrit des lignes dans un CSV par blocs de chunk_size ; chaque bloc écrit
+    est sur disque et survit à un crash de la suite du run.
+
+    Avec un uploader (HdfsUploader), chaque bloc est aussi envoyé dans un flux
+    HDFS pendant l'extraction, publié à close(). Une reprise (append) envoie
+    le fichier complet à close().
+
+    compression (none, gzip, zstd) : chaque bloc est un membre gzip / une
+    trame zstd et path reçoit l'extension du codec (posts.csv.gz).
+    """
+
+    def __init__(
+        self,
+        path,
+        column_types,
+        chunk_size=CHUNK_SIZE,
+        append=False,
+        uploader=None,
+        compression="none",
+    ):
+        self.path = compressed_path(path, compression)
+        self.chunk_size = chunk_size
+        self.rows_written = 0
+        self.uploader = uploader
+        self._append = append
+        self._stream = None
+        self._encoder = ChunkEncoder(compression)
+        self._buffer = ColumnBuilder(column_types)
+        if not append:
+            # Y compris les copies d'un autre codec : un seul fichier par dataset
+            for stale_path in codec_variants(path):
+                if os.path.exists(stale_path):
+                    os.remove(stale_path)
+
+    def write(self, row):
+        self._buffer.append(row)
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not len(self._buffer):
+            return
+        with open(self.path, "ab") as f:
+            csv_text = self._buffer.to_pandas().to_csv(
+                header=f.tell() == 0, index=False
+            )
+            data = self._encoder.encode(csv_text.encode("utf-8"))
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if self.uploader and not self._append:
+            if self._stream is None:
+                self._stream = self.uploader.stream(
+                    self.path, os.path.basename(self.path)
+                )
+            self._stream.write(data)
+        self.rows_written += len(self._buffer)
+        self._buffer.clear()
+
+    def close(self):
+        self.flush()
+        if self._stream:
+            self._stream.close()
+        elif self.uploader and os.path.exists(self.path):
+            self.uploader.submit(self.path, os.path.basename(self.path))
+
+
+class ParquetPartitionWriter:
+    """Même interface que ChunkedCsvWriter, mais écrit des fichiers Parquet typés
+    partitionnés par subreddit et par jour de création :
+    <root>/subreddit=<nom>/date=<AAAA-MM-JJ>/part-<run>-<n>.parquet"""
+
+    PARTITION_COLUMN = "subreddit"
+
+    def __init__(
+        self,
+        root,
+        column_types,
+        chunk_size=CHUNK_SIZE,
+        append=False,
+        uploader=None,
+        compression="snappy",
+    ):
+        if not PYARROW_AVAILABLE:
+            raise ImportError("pyarrow est requis pour le format parquet")
+        self.path = root
+        # Codec interne des pages Parquet (le fichier garde l'extension .parquet)
+        self.compression = compression
+        self.chunk_size = chunk_size
+        self.rows_written = 0
+        # Chaque fichier terminé part vers HDFS en tâche de fond
+        self.uploader = uploader
+        self._append = append
+        # Une colonne par champ et par partition (subreddit, jour) en attente
+        self._file_types = {
+            name: alias
+            for name, alias in column_types.items()
+            if name != self.PARTITION_COLUMN
+        }
+        self._partitions = {}
+        self._buffered = 0
+        # Unique par writer : des micro-batches successifs ne s'écrasent jamais
+        self._run_token = (
+            f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        )
+        self._file_seq = 0
+        if not append and os.path.exists(root):
+            shutil.rmtree(root)
+
+    def write(self, row):
+        day = datetime.fromtimestamp(row["created_utc"], tz=timezone.utc).strftime(
+            "%Y-%m-%d"
+        )
+        key = (row[self.PARTITION_COLUMN], day)
+        if key not in self._partitions:
+            self._partitions[key] = ColumnBuilder(self._file_types)
+        self._partitions[key].append(row)
+        self._buffered += 1
+        if self._buffered >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffered:
+            return
+        for (sub_name, day), columns in self._partitions.items():
+            part_dir = os.path.join(
+                self.path, f"{self.PARTITION_COLUMN}={sub_name}", f"date={day}"
+            )
+            os.makedirs(part_dir, exist_ok=True)
+            file_name = f"part-{self._run_token}-{self._file_seq:05d}.parquet"
+            self._file_seq += 1
+            # Fichier caché pendant l'écriture : Spark ne lit jamais un bloc partiel
+            tmp_path = os.path.join(part_dir, f".{file_name}.tmp")
+            pq.write_table(columns.to_arrow(), tmp_path, compression=self.compression)
+            file_path = os.path.join(part_dir, file_name)
+            os.replace(tmp_path, file_path)
+            if self.uploader and not self._append:
+                self.uploader.submit(file_path, self._relpath(file_path))
+
+        self.rows_written += self._buffered
+        self._partitions = {}
+        self._buffered = 0
 
-        return pd.DataFrame(all_posts), pd.DataFrame(all_comments)
+    def _relpath(self, file_path):
+        return os.path.relpath(file_path, os.path.dirname(self.path) or ".")
+
+    def close(self):
+        self.flush()
+        if self.uploader and self._append and os.path.exists(self.path):
+            # Reprise : les fichiers du run interrompu n'ont peut-être jamais été envoyés
+            for dir_path, _, file_names in os.walk(self.path):
+                for file_name in file_names:
+                    if not file_name.startswith("."):
+                        file_path = os.path.join(dir_path, file_name)
+                        self.uploader.submit(file_path, self._relpath(file_path))
+
+
+def open_writers(
+    output_format,
+    chunk_size=CHUNK_SIZE,
+    append=False,
+    uploader=None,
+    compression=COMPRESSION,
+):
+    """Retourne (writer posts, writer commentaires) pour le format demandé.
+    compression : none, gzip ou zstd (fichiers CSV compressés en flux, codec
+    des pages Parquet)."""
+    if output_format == "parquet":
+        return (
+            ParquetPartitionWriter(
+                "posts", POST_TYPES, chunk_size, append, uploader, compression
+            ),
+            ParquetPartitionWriter(
+                "comments", COMMENT_TYPES, chunk_size, append, uploader, compression
+            ),
+        )
+    return (
+        ChunkedCsvWriter(
+            "posts.csv", POST_TYPES, chunk_size, append, uploader, compression
+        ),
+        ChunkedCsvWriter(
+            "comments.csv", COMMENT_TYPES, chunk_size, append, uploader, compression
+        ),
+    )
+
+
+def write_records(
+    records, posts_writer, comments_writer, checkpoint=None, seen_index=None
+):
+    """Consomme iter_reddit_records ; un watermark n'avance (et les ids ne sont
+    marqués comme vus) qu'une fois les données du subreddit écrites sur disque."""
+    for event in records:
+        kind = event[0]
+        if kind == "post":
+            posts_writer.write(event[1])
+        elif kind == "comment":
+            comments_writer.write(event[1])
+        elif kind == "done":
+            posts_writer.flush()
+            comments_writer.flush()
+            if checkpoint:
+                checkpoint.complete_subreddit(*event[1:])
+            if seen_index:
+                seen_index.commit()
+    posts_writer.flush()
+    comments_writer.flush()
+    if seen_index:
+        seen_index.commit()
+
+
+def extract_reddit_data(
+    subreddits,
+    limit=100,
+    comments_limit=5,
+    workers=1,
+    client_factory=create_reddit_client,
+    budget=None,
+    checkpoint=None,
+    comment_policy=None,
+    seen_index=None,
+):
+    """Extrait posts et commentaires en mémoire (DataFrames) ; pour les gros
+    volumes, préférer iter_reddit_records + ChunkedCsvWriter."""
+    try:
+        # En colonnes typées : pas de dict conservé par ligne jusqu'à la fin
+        builders = {
+            "post": ColumnBuilder(POST_TYPES),
+            "comment": ColumnBuilder(COMMENT_TYPES),
+        }
+        for event in iter_reddit_records(
+            subreddits,
+            limit,
+            comments_limit,
+            workers,
+            client_factory,
+            budget,
+            checkpoint,
+            comment_policy,
+            seen_index,
+        ):
+            if event[0] in builders:
+                builders[event[0]].append(event[1])
+            elif event[0] == "done":
+                if checkpoint:
+                    checkpoint.complete_subreddit(*event[1:])
+                if seen_index:
+                    seen_index.commit()
+
+        return builders["post"].to_pandas(), builders["comment"].to_pandas()
 
     except Exception as e:
         print(f"Erreur API Reddit : {e}")
         return None, None
 
 
+class _MicroBatch:
+    """Micro-batch du daemon : fichiers Parquet locaux + watermarks en attente
+    d'upload."""
+
+    def __init__(self, root, compression="snappy"):
+        # Chaque micro-batch est un run (partition immuable + entrée du manifeste)
+        self.run_id = new_run_id()
+        self.dir = os.path.join(root, self.run_id)
+        self.compression = compression
+        self.writers = {
+            "post": ParquetPartitionWriter(
+                os.path.join(self.dir, "posts"), POST_TYPES, compression=compression
+            ),
+            "comment": ParquetPartitionWriter(
+                os.path.join(self.dir, "comments"),
+                COMMENT_TYPES,
+                compression=compression,
+            ),
+        }
+        self.rows = 0
+        self.done = []
+        self.subreddits = set()
+        self.created = time.monotonic()
+
+    def write(self, kind, record):
+        self.writers[kind].write(record)
+        self.rows += 1
+        self.subreddits.add(record["subreddit"])
+
+
+def run_daemon(
+    subreddits,
+    hdfs_dir,
+    limit=100,
+    workers=1,
+    checkpoint=None,
+    seen_index=None,
+    poll_interval=60,
+    max_poll_interval=900,
+    flush_interval=60,
+    flush_records=5000,
+    batch_root="stream_batches",
+    client_factory=create_reddit_client,
+    budget=None,
+    upload=hdfs_put,
+    scheduler=None,
+    polls_per_minute=None,
+    compression="snappy",
+):
+    """Interroge les subreddits en continu et pousse des micro-batches Parquet
+    vers HDFS toutes les flush_interval secondes ou tous les flush_records
+    enregistrements.
+
+    Le polling suit l'activité apprise par le scheduler (ActivityScheduler) :
+    les polls_per_minute (par défaut la moitié du budget API, un poll coûtant
+    une page de posts et une de commentaires) sont répartis en proportion du
+    taux d'arrivée (posts et commentaires) de chaque subreddit, entre
+    poll_interval et max_poll_interval. Un flux avec watermark est lu jusqu'à
+    lui ; sans watermark (premier poll, daemon sans checkpoint), il est demandé
+    avec une limite couvrant l'intervalle à son propre taux.
+    Watermarks, ids vus et activité ne sont validés qu'après un upload réussi ;
+    en cas d'échec, les données seront ré-extraites. Un flush déclenché par
+    flush_records peut couper le poll d'un subreddit : si son upload échoue, le
+    watermark de ce poll n'est pas validé avant que le subreddit soit
+    ré-interrogé depuis l'ancien watermark.
+    """
+    clients = ClientPool(client_factory)
+    budget = budget or RateLimiter()
+    scheduler = scheduler or ActivityScheduler(path=None)
+    if polls_per_minute is None:
+        polls_per_minute = budget.base_rate * 60 / 2
+    intervals = scheduler.poll_intervals(
+        subreddits, polls_per_minute, poll_interval, max_poll_interval
+    )
+    next_poll = dict.fromkeys(subreddits, 0.0)
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    batch = _MicroBatch(batch_root, compression)
+    # Subreddits dont des lignes ont été perdues par un upload en échec
+    dirty = set()
+
+    def flush():
+        nonlocal batch
+        if batch.rows or batch.done:
+            for writer in batch.writers.values():
+                writer.flush()
+            try:
+                # Posts et commentaires envoyés en parallèle
+                paths = [
+                    w.path for w in batch.writers.values() if os.path.exists(w.path)
+                ]
+                if paths:
+                    upload(
+                        paths,
+                        hdfs_dir,
+                        run={
+                            "run_id": batch.run_id,
+                            "output_format": "parquet",
+                            "rows": {
+                                "posts": batch.writers["post"].rows_written,
+                                "comments": batch.writers["comment"].rows_written,
+                            },
+                            "mode": "daemon",
+                            "compression": compression,
+                        },
+                    )
+            except Exception as e:
+                print(
+                    f"Échec de l'upload HDFS du micro-batch ({batch.rows} lignes) : {e}"
+                )
+                if seen_index:
+                    seen_index.rollback()
+                dirty.update(batch.subreddits)
+            else:
+                if batch.rows:
+                    print(f"Micro-batch envoyé vers {hdfs_dir} ({batch.rows} lignes)")
+                if checkpoint:
+                    for done in batch.done:
+                        checkpoint.complete_subreddit(*done)
+                if seen_index:
+                    seen_index.commit()
+                scheduler.save()
+            shutil.rmtree(batch.dir, ignore_errors=True)
+        batch = _MicroBatch(batch_root, compression)
+
+    print(f"Daemon démarré sur {len(subreddits)} subreddit(s) (Ctrl+C pour arrêter)")
+    try:
+        while not stopping.is_set():
+            now = time.monotonic()
+            due = [s for s in subreddits if next_poll[s] <= now]
+            # Un watermark non encore validé ferait ré-extraire les mêmes données
+            if any(done[0] in due for done in batch.done):
+                flush()
+
+            if due:
+                # Ré-interrogés depuis leur watermark validé : le trou est couvert
+                dirty.difference_update(due)
+                # Limites des seuls flux sans watermark (les autres vont jusqu'à lui)
+                limits = {s: scheduler.poll_limit(s, intervals[s], limit) for s in due}
+                comment_limits = {
+                    s: scheduler.poll_limit(s, intervals[s], limit, kind="comments")
+                    for s in due
+                }
+                for event in iter_reddit_records(
+                    due,
+                    limits,
+                    workers=workers,
+                    client_factory=clients,
+                    budget=budget,
+                    checkpoint=checkpoint,
+                    seen_index=seen_index,
+                    comment_stream=True,
+                    scheduler=scheduler,
+                    comment_stream_limit=comment_limits,
+                    follow_watermark=True,
+                ):
+                    if event[0] in ("post", "comment"):
+                        batch.write(event[0], event[1])
+                        if batch.rows >= flush_records:
+                            flush()
+                    elif event[0] == "done" and event[1] not in dirty:
+                        batch.done.append(event[1:])
+
+                intervals = scheduler.poll_intervals(
+                    subreddits, polls_per_minute, poll_interval, max_poll_interval
+                )
+                for sub_name in due:
+                    next_poll[sub_name] = time.monotonic() + intervals[sub_name]
+
+            if time.monotonic() - batch.created >= flush_interval:
+                flush()
+            wake_up = min(min(next_poll.values()), batch.created + flush_interval)
+            stopping.wait(max(0.0, min(wake_up - time.monotonic(), 5.0)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("Arrêt du daemon : envoi du dernier micro-batch...")
+        flush()
+        shutil.rmtree(batch.dir, ignore_errors=True)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--subreddits", nargs="+", default=["datascience"])
     parser.add_argument("--limit", type=int, default=50)
     parser.add_argument("--comments_limit", type=int, default=5)  # Nouveau paramètre
+    parser.add_argument(
+        "--comments_sort",
+        default="top",
+        choices=["top", "best", "new", "controversial", "old", "q&a"],
+    )
+    parser.add_argument(
+        "--comments_depth",
+        type=int,
+        default=0,
+        help="Profondeur max des commentaires (0 = premier niveau)",
+    )
+    parser.add_argument(
+        "--min_post_score",
+        type=int,
+        default=None,
+        help="Ne charge les commentaires que des posts ayant au moins ce score",
+    )
+    parser.add_argument(
+        "--min_post_comments",
+        type=int,
+        default=1,
+        help="Ne charge les commentaires que des posts ayant au moins ce nombre de commentaires",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Threads d'extraction (1 = séquentiel)"
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Processus d'extraction, un par jeu d'identifiants "
+        "(REDDIT_CLIENT_ID_<n>) ; 0 = un par jeu disponible",
+    )
+    parser.add_argument(
+        "--requests_per_minute",
+        type=int,
+        default=REQUESTS_PER_MINUTE,
+        help="Budget API par jeu d'identifiants (0 = seulement les en-têtes de quota Reddit)",
+    )
+    parser.add_argument(
+        "--max_retries", type=int, default=5, help="Retries sur 429/5xx/réseau"
+    )
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Ignore les watermarks (extraction complète)",
+    )
+    parser.add_argument("--seen_index", default=SEEN_INDEX_PATH)
+    parser.add_argument(
+        "--no_dedup",
+        action="store_true",
+        help="N'écarte pas les posts/commentaires déjà ingérés",
+    )
+    parser.add_argument(
+        "--activity",
+        default=ACTIVITY_PATH,
+        help="Taux d'arrivée appris par subreddit",
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="Saute les subreddits sans nouveau post attendu et répartit "
+        "limit x nb subreddits en proportion de leur activité",
+    )
+    parser.add_argument(
+        "--polls_per_minute",
+        type=float,
+        default=None,
+        help="Daemon : polls répartis selon l'activité (défaut : budget API / 2)",
+    )
+    parser.add_argument(
+        "--chunk_size", type=int, default=CHUNK_SIZE, help="Lignes par écriture disque"
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Polling continu et envoi de micro-batches Parquet vers HDFS",
+    )
+    parser.add_argument("--hdfs_dir", default="/reddit_data")
+    parser.add_argument(
+        "--upload",
+        action="store_true",
+        help="Envoie les fichiers vers --hdfs_dir pendant l'extraction",
+    )
+    parser.add_argument(
+        "--poll_interval", type=float, default=60, help="Secondes entre deux polls"
+    )
+    parser.add_argument(
+        "--max_poll_interval",
+        type=float,
+        default=900,
+        help="Intervalle max pour un subreddit inactif",
+    )
+    parser.add_argument(
+        "--flush_interval", type=float, default=60, help="Secondes par micro-batch"
+    )
+    parser.add_argument(
+        "--flush_records", type=int, default=5000, help="Lignes max par micro-batch"
+    )
+    parser.add_argument(
+        "--format",
+        choices=["csv", "parquet"],
+        default="csv",
+        help="parquet : dossiers posts/ et comments/ partitionnés par subreddit et date",
+    )
+    parser.add_argument(
+        "--compression",
+        choices=list(EXTENSIONS),
+        default=COMPRESSION,
+        help="Codec des fichiers extraits (CSV : posts.csv.gz / .zst)",
+    )
     args = parser.parse_args()
 
+    budget = RateLimiter(args.requests_per_minute, max_retries=args.max_retries)
+    scheduler = ActivityScheduler(args.activity)
+
+    if args.daemon:
+        seen_index = None if args.no_dedup else SeenIndex(args.seen_index)
+        try:
+            run_daemon(
+                args.subreddits,
+                args.hdfs_dir,
+                args.limit,
+                args.workers,
+                checkpoint=None if args.full else CheckpointStore(args.checkpoint),
+                seen_index=seen_index,
+                poll_interval=args.poll_interval,
+                max_poll_interval=args.max_poll_interval,
+                flush_interval=args.flush_interval,
+                flush_records=args.flush_records,
+                budget=budget,
+                scheduler=scheduler,
+                polls_per_minute=args.polls_per_minute,
+                compression=args.compression,
+            )
+        finally:
+            if seen_index:
+                seen_index.close()
+        raise SystemExit(0)
+
     print("--- Démarrage de l'extraction ---")
-    df_posts, df_comments = extract_reddit_data(
-        args.subreddits, args.limit, args.comments_limit
+    checkpoint = None if args.full else CheckpointStore(args.checkpoint)
+    subreddits = args.subreddits
+    resumed = False
+    run_id = new_run_id()
+    if checkpoint:
+        try:
+            subreddits, resumed = checkpoint.start_run(args.subreddits, run_id)
+        except PendingRunError as e:
+            raise SystemExit(f"Erreur : {e}")
+        run_id = checkpoint.run_id or run_id
+        if resumed:
+            print(
+                f"Reprise du run interrompu : {len(subreddits)} subreddit(s) restant(s)"
+            )
+
+    limit = args.limit
+    if args.adaptive:
+        # Le budget des subreddits calmes est reporté sur les plus actifs
+        total_posts = args.limit * len(args.subreddits)
+        subreddits = scheduler.due(subreddits)
+        limit = scheduler.allocate_limits(subreddits, total_posts)
+        print(
+            f"Planification : {len(subreddits)} subreddit(s) à interroger sur "
+            f"{len(args.subreddits)}"
+        )
+
+    # Un nouveau run repart de fichiers vides ; une reprise complète les fichiers existants
+    uploader = HdfsUploader(args.hdfs_dir, run_id=run_id) if args.upload else None
+    posts_writer, comments_writer = open_writers(
+        args.format,
+        args.chunk_size,
+        append=resumed,
+        uploader=uploader,
+        compression=args.compression,
     )
 
-    if df_posts is not None and not df_posts.empty:
-        df_posts.to_csv("posts.csv", index=False)
-        print(f"Posts sauvegardés dans posts.csv ({len(df_posts)} lignes)")
+    seen_index = None if args.no_dedup else SeenIndex(args.seen_index)
+    completed = False
+    try:
+        comment_policy = CommentPolicy(
+            args.comments_limit,
+            args.comments_sort,
+            args.comments_depth,
+            args.min_post_score,
+            args.min_post_comments,
+        )
+        credentials = load_credentials()
+        shards = args.shards or len(credentials)
+        if shards > 1:
+            if shards > len(credentials):
+                # Deux shards sur la même app OAuth se partageraient un seul quota
+                print(
+                    f"{len(credentials)} jeu(x) d'identifiants : "
+                    f"{shards} shards demandés, {len(credentials)} lancés"
+                )
+            records = iter_sharded_records(
+                subreddits,
+                limit,
+                [
+                    functools.partial(create_reddit_client, c)
+                    for c in credentials[:shards]
+                ],
+                requests_per_minute=args.requests_per_minute,
+                max_retries=args.max_retries,
+                workers=args.workers,
+                checkpoint=checkpoint,
+                comment_policy=comment_policy,
+                seen_index=seen_index,
+                scheduler=scheduler,
+            )
+        else:
+            records = iter_reddit_records(
+                subreddits,
+                limit,
+                args.comments_limit,
+                workers=args.workers,
+                budget=budget,
+                checkpoint=checkpoint,
+                comment_policy=comment_policy,
+                seen_index=seen_index,
+                scheduler=scheduler,
+            )
+        write_records(records, posts_writer, comments_writer, checkpoint, seen_index)
+        completed = True
+    except Exception as e:
+        print(f"Erreur API Reddit : {e}")
+    except BaseException:
+        # Interruption (Ctrl+C) : les lignes en mémoire sont perdues, leurs ids
+        # en attente sont oubliés par close() et seront ré-extraits
+        if seen_index:
+            seen_index.close()
+        raise
+
+    # Le run n'est clos qu'une fois publié : un échec d'upload laisse le run en
+    # attente, repris (même run_id) et renvoyé en entier au lancement suivant
+    try:
+        posts_writer.close()
+        comments_writer.close()
+        # Toutes les lignes sont sur disque : leurs ids peuvent être validés
+        if seen_index and completed:
+            seen_index.commit()
+        if uploader:
+            uploader.close()
+        # Seul un run terminé et non vide entre au manifeste
+        if (
+            uploader
+            and completed
+            and (posts_writer.rows_written or comments_writer.rows_written or resumed)
+        ):
+            uploader.publish(
+                args.format,
+                {
+                    "posts": posts_writer.rows_written,
+                    "comments": comments_writer.rows_written,
+                },
+                mode="batch",
+                compression=args.compression,
+                subreddits=args.subreddits,
+            )
+            print(f"Run {run_id} publié dans HDFS ({uploader.dataset_dir('posts')})")
+    except Exception as e:
+        raise SystemExit(f"Erreur upload HDFS : {e}")
+    finally:
+        if seen_index:
+            seen_index.close()
+
+    if completed:
+        if checkpoint:
+            checkpoint.finish_run()
+        scheduler.save()
+
+    if posts_writer.rows_written:
+        print(
+            f"Posts sauvegardés dans {posts_writer.path} ({posts_writer.rows_written} nouvelles lignes)"
+        )
     else:
-        print("Aucun post extrait.")
+        print("Aucun nouveau post extrait.")
 
-    if df_comments is not None and not df_comments.empty:
-        df_comments.to_csv("comments.csv", index=False)
-        print(f"Commentaires sauvegardés dans comments.csv ({len(df_comments)} lignes)")
+    if comments_writer.rows_written:
+        print(
+            f"Commentaires sauvegardés dans {comments_writer.path} ({comments_writer.rows_written} nouvelles lignes)"
+        )
     else:
-        print("Aucun commentaire extrait.")
+        print("Aucun nouveau commentaire extrait.")
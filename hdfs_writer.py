@@ -0,0 +1,220 @@
+import json
+import os
+import posixpath
+import shutil
+import subprocess
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+DOCKER_CMD = shutil.which("docker") or "docker"
+NAMENODE_CONTAINER = os.getenv("HDFS_NAMENODE_CONTAINER", "namenode")
+
+# Uploads simultanés (un processus `hdfs dfs -put` par fichier)
+UPLOAD_WORKERS = 4
+
+# Manifeste des runs publiés : un fichier JSON par run, écrit en dernier
+RUNS_MANIFEST_DIR = "_runs"
+
+
+def new_run_id():
+    """Identifiant de run triable chronologiquement (UTC) et unique."""
+    return f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}Z-{uuid.uuid4().hex[:8]}"
+
+
+def _ingest_date(run_id):
+    return datetime.strptime(run_id[:8], "%Y%m%d").strftime("%Y-%m-%d")
+
+
+def run_partition(run_id):
+    """Partition immuable d'un run : ingest_date=<AAAA-MM-JJ>/run_id=<run_id>."""
+    return f"ingest_date={_ingest_date(run_id)}/run_id={run_id}"
+
+
+def _namenode_exec(*args):
+    subprocess.run(
+        [DOCKER_CMD, "exec", NAMENODE_CONTAINER, *args],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+
+
+def _put_command(hdfs_path):
+    # `-put -` lit le fichier sur stdin : pas de copie temporaire dans le conteneur
+    return [
+        DOCKER_CMD,
+        "exec",
+        "-i",
+        NAMENODE_CONTAINER,
+        "hdfs",
+        "dfs",
+        "-put",
+        "-f",
+        "-",
+        hdfs_path,
+    ]
+
+
+def _put_file(local_path, hdfs_path):
+    with open(local_path, "rb") as f:
+        subprocess.run(
+            _put_command(hdfs_path), stdin=f, check=True, capture_output=True
+        )
+
+
+class HdfsStream:
+    """Fichier HDFS écrit au fil de l'eau via le stdin de `hdfs dfs -put -`.
+
+    HDFS ne publie le fichier qu'à close(). Si le flux casse en route, close()
+    renvoie le fichier local fallback_path complet (copie locale du writer).
+    """
+
+    def __init__(self, hdfs_path, fallback_path=None):
+        self.hdfs_path = hdfs_path
+        self.fallback_path = fallback_path
+        self._broken = False
+        self._proc = subprocess.Popen(
+            _put_command(hdfs_path),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+
+    def write(self, data):
+        if self._broken:
+            return
+        try:
+            self._proc.stdin.write(data)
+        except (BrokenPipeError, OSError):
+            self._broken = True
+
+    def close(self):
+        try:
+            _, stderr = self._proc.communicate()
+        except (BrokenPipeError, OSError):
+            self._proc.wait()
+            stderr = b""
+        if not self._broken and self._proc.returncode == 0:
+            return
+        if self.fallback_path is None:
+            raise subprocess.CalledProcessError(
+                self._proc.returncode, self._proc.args, stderr=stderr
+            )
+        print(f"Flux HDFS interrompu, renvoi complet de {self.fallback_path}...")
+        _put_file(self.fallback_path, self.hdfs_path)
+
+
+class HdfsUploader:
+    """Envoie des fichiers sous hdfs_dir pendant que l'extraction continue :
+    flux (stream) pour un fichier encore en cours d'écriture, upload en tâche
+    de fond (submit) pour un fichier terminé. close() attend la fin des
+    uploads en tâche de fond et lève la première erreur.
+
+    Avec un run_id, les données ne sont jamais écrasées : posts.csv ou
+    posts/<partitions> vont dans <hdfs_dir>/posts/ingest_date=.../run_id=.../,
+    et publish() ajoute le run au manifeste une fois tout envoyé.
+    """
+
+    def __init__(self, hdfs_dir, workers=UPLOAD_WORKERS, run_id=None):
+        self.hdfs_dir = hdfs_dir.rstrip("/")
+        self.run_id = run_id
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._futures = []
+        self._dirs = set()
+        self._lock = threading.Lock()
+        self.mkdirs(self.hdfs_dir)
+
+    def mkdirs(self, *hdfs_dirs):
+        with self._lock:
+            missing = sorted(set(hdfs_dirs) - self._dirs)
+            if missing:
+                _namenode_exec("hdfs", "dfs", "-mkdir", "-p", *missing)
+                self._dirs.update(missing)
+
+    def dataset_dir(self, dataset):
+        """Dossier HDFS du dataset (posts, comments) pour ce run."""
+        if self.run_id is None:
+            return posixpath.join(self.hdfs_dir, dataset)
+        return posixpath.join(self.hdfs_dir, dataset, run_partition(self.run_id))
+
+    def _target(self, name):
+        parts = name.split(os.sep)
+        if self.run_id is None:
+            return posixpath.join(self.hdfs_dir, *parts)
+        # posts.csv[.gz] -> posts/<run>/posts.csv[.gz] ; posts/<p>/x.parquet -> posts/<run>/<p>/x.parquet
+        dataset = parts[0].split(".")[0]
+        return posixpath.join(self.dataset_dir(dataset), *(parts[1:] or parts))
+
+    def stream(self, local_path, name):
+        """HdfsStream vers <hdfs_dir>/<name> ; local_path sert de secours."""
+        target = self._target(name)
+        self.mkdirs(posixpath.dirname(target))
+        return HdfsStream(target, local_path)
+
+    def submit(self, local_path, name):
+        target = self._target(name)
+        self.mkdirs(posixpath.dirname(target))
+        self._futures.append(self._pool.submit(_put_file, local_path, target))
+
+    def close(self):
+        try:
+            for future in self._futures:
+                future.result()
+        finally:
+            self._pool.shutdown(cancel_futures=True)
+
+    def publish(self, output_format, rows, **info):
+        """Ajoute le run au manifeste <hdfs_dir>/_runs/<run_id>.json (une ligne
+        JSON lisible par spark.read.json). rows : {dataset: lignes écrites}."""
+        entry = {
+            "run_id": self.run_id,
+            "ingest_date": _ingest_date(self.run_id),
+            "format": output_format,
+            "rows": rows,
+            "paths": {dataset: self.dataset_dir(dataset) for dataset in rows},
+            "published_at": datetime.now(timezone.utc).isoformat(),
+            **info,
+        }
+        manifest_dir = posixpath.join(self.hdfs_dir, RUNS_MANIFEST_DIR)
+        self.mkdirs(manifest_dir)
+        stream = HdfsStream(posixpath.join(manifest_dir, f"{self.run_id}.json"))
+        stream.write((json.dumps(entry) + "\n").encode("utf-8"))
+        stream.close()
+
+
+def _local_files(local_path):
+    if os.path.isfile(local_path):
+        yield local_path, os.path.basename(local_path)
+        return
+    root = os.path.dirname(os.path.normpath(local_path))
+    for dir_path, dir_names, file_names in os.walk(local_path):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            # Fichiers cachés : blocs Parquet en cours d'écriture
+            if not file_name.startswith("."):
+                path = os.path.join(dir_path, file_name)
+                yield path, os.path.relpath(path, root)
+
+
+def hdfs_put(local_paths, hdfs_parent, run=None):
+    """Copie un ou plusieurs fichiers ou dossiers locaux dans le dossier HDFS
+    hdfs_parent, fichiers envoyés en parallèle.
+
+    Un dossier existant côté HDFS est complété (fusion), les fichiers de même
+    nom sont écrasés. Avec run (run_id et arguments de HdfsUploader.publish),
+    les fichiers vont dans la partition du run, publiée ensuite au manifeste.
+    Lève subprocess.CalledProcessError en cas d'échec.
+    """
+    if isinstance(local_paths, str):
+        local_paths = [local_paths]
+    run = dict(run or {})
+    files = [f for path in local_paths for f in _local_files(path)]
+    uploader = HdfsUploader(hdfs_parent, run_id=run.pop("run_id", None))
+    uploader.mkdirs(*{posixpath.dirname(uploader._target(name)) for _, name in files})
+    for path, name in files:
+        uploader.submit(path, name)
+    uploader.close()
+    if uploader.run_id and files:
+        uploader.publish(**run)
@@ -0,0 +1,149 @@
+"""Rafraîchit score et num_comments des posts récents déjà chargés dans PostgreSQL.
+
+Les métriques d'un post extrait quelques minutes après sa publication restent
+figées à leur valeur initiale. Ce job relit celles des posts encore dans la
+fenêtre active via l'endpoint `info` de Reddit (100 fullnames par requête) et
+met à jour les lignes de reddit_posts en place, sans ré-extraire les posts.
+
+Usage : python metrics_refresh.py --window_hours 48
+"""
+
+import argparse
+import csv
+import io
+import os
+import re
+import subprocess
+import time
+
+import subreddit_stats
+from extraction_reddit import create_reddit_client
+from hdfs_writer import DOCKER_CMD
+from rate_limiter import REQUESTS_PER_MINUTE, RateLimiter
+from seen_index import fullname
+
+POSTGRES_CONTAINER = os.getenv("POSTGRES_CONTAINER", "postgres_db")
+
+# Nombre max de fullnames acceptés par /api/info
+INFO_BATCH_SIZE = 100
+
+
+def _psql(*args, script=None):
+    """Exécute psql dans le conteneur PostgreSQL ; script est lu sur stdin."""
+    res = subprocess.run(
+        [
+            DOCKER_CMD,
+            "exec",
+            "-i",
+            POSTGRES_CONTAINER,
+            "psql",
+            "-U",
+            "admin",
+            "-d",
+            "reddit_db",
+            "-v",
+            "ON_ERROR_STOP=1",
+            *args,
+        ],
+        input=script,
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+    )
+    if res.returncode != 0:
+        raise RuntimeError(res.stderr.strip())
+    return res.stdout
+
+
+def active_post_ids(window_hours):
+    """Ids des posts publiés depuis moins de window_hours heures."""
+    cutoff = time.time() - window_hours * 3600
+    query = (
+        "SELECT DISTINCT id FROM reddit_posts "
+        f"WHERE created_utc::double precision >= {cutoff:.0f}"
+    )
+    return _psql("-c", f"COPY ({query}) TO STDOUT").split()
+
+
+def fetch_metrics(client, post_ids, budget):
+    """Génère (id, score, num_comments) par lots de INFO_BATCH_SIZE fullnames,
+    une requête API par lot."""
+    for i in range(0, len(post_ids), INFO_BATCH_SIZE):
+        fullnames = [fullname("post", pid) for pid in post_ids[i : i + INFO_BATCH_SIZE]]
+        try:
+            submissions = budget.call(
+                lambda: list(client.info(fullnames=fullnames)), client=client
+            )
+        except Exception as e:
+            print(f"Erreur lot info ({len(fullnames)} posts) : {e}")
+            budget.record_lost("lots_info")
+            continue
+        for submission in submissions:
+            yield submission.id, submission.score, submission.num_comments
+
+
+def update_metrics(rows):
+    """Met à jour reddit_posts en une transaction (table temporaire + UPDATE),
+    stats par subreddit comprises ; retourne le nombre de lignes modifiées."""
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    # Nouvelles valeurs (+1) et valeurs remplacées (-1) des posts rafraîchis
+    changed = (
+        "SELECT p.subreddit, {score}, p.sentiment, {num_comments}, {sign} "
+        "FROM reddit_posts p JOIN post_metrics m ON p.id = m.id"
+    )
+    delta_rows = (
+        changed.format(score="m.score", num_comments="m.num_comments", sign=1)
+        + " UNION ALL "
+        + changed.format(score="p.score", num_comments="p.num_comments", sign=-1)
+    )
+    script = (
+        "BEGIN;\n"
+        "CREATE TEMP TABLE post_metrics "
+        "(id text PRIMARY KEY, score real, num_comments integer) ON COMMIT DROP;\n"
+        "COPY post_metrics FROM STDIN WITH (FORMAT csv);\n"
+        f"{buffer.getvalue()}\\.\n"
+        + "".join(
+            f"{sql};\n"
+            for sql in subreddit_stats.bootstrap_statements()
+            + subreddit_stats.delta_statements(delta_rows)
+        )
+        + "UPDATE reddit_posts p SET score = m.score, num_comments = m.num_comments "
+        "FROM post_metrics m WHERE p.id = m.id "
+        "AND (p.score IS DISTINCT FROM m.score "
+        "OR p.num_comments IS DISTINCT FROM m.num_comments);\n"
+        + "".join(f"{sql};\n" for sql in subreddit_stats.merge_statements())
+        + "COMMIT;\n"
+    )
+    # Premier « UPDATE n » de la sortie : celui de reddit_posts
+    match = re.search(r"^UPDATE (\d+)$", _psql(script=script), re.MULTILINE)
+    return int(match.group(1)) if match else 0
+
+
+def refresh_metrics(window_hours=48, client=None, budget=None):
+    client = client or create_reddit_client()
+    budget = budget or RateLimiter()
+    post_ids = active_post_ids(window_hours)
+    if not post_ids:
+        print(f"Aucun post publié dans les dernières {window_hours}h.")
+        return 0
+    print(f"Rafraîchissement de {len(post_ids)} posts ({window_hours}h)...")
+    rows = list(fetch_metrics(client, post_ids, budget))
+    updated = update_metrics(rows) if rows else 0
+    print(budget.report())
+    print(f"Posts mis à jour dans reddit_posts : {updated}")
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--window_hours",
+        type=float,
+        default=48,
+        help="Âge max des posts dont les métriques évoluent encore",
+    )
+    parser.add_argument("--requests_per_minute", type=int, default=REQUESTS_PER_MINUTE)
+    args = parser.parse_args()
+
+    refresh_metrics(args.window_hours, budget=RateLimiter(args.requests_per_minute))
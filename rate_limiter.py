@@ -0,0 +1,156 @@
+import os
+import random
+import threading
+import time
+from collections import Counter
+
+try:
+    from prawcore.exceptions import RequestException as _NetworkError
+except ImportError:
+    _NetworkError = ConnectionError
+
+# Budget API Reddit partagé par tous les threads (100 requêtes/minute par app OAuth)
+REQUESTS_PER_MINUTE = int(os.getenv("REDDIT_REQUESTS_PER_MINUTE", "100"))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def _status_code(exc):
+    return getattr(getattr(exc, "response", None), "status_code", None)
+
+
+def is_retryable(exc):
+    """429, erreurs 5xx et coupures réseau : la requête peut être rejouée."""
+    if _status_code(exc) in RETRYABLE_STATUS:
+        return True
+    return isinstance(exc, (_NetworkError, ConnectionError, TimeoutError))
+
+
+def _retry_after(exc):
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Token bucket partagé entre threads, recalé sur les en-têtes de quota Reddit.
+
+    Le débit de base (requests_per_minute, 0 = illimité) est abaissé quand Reddit
+    annonce qu'il reste peu de requêtes avant la fin de la fenêtre, et bloqué
+    jusqu'à sa réinitialisation quand le quota est épuisé. call() rejoue les 429,
+    5xx et erreurs réseau avec un backoff exponentiel à jitter complet.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute=REQUESTS_PER_MINUTE,
+        burst=10,
+        max_retries=5,
+        backoff_base=1.0,
+        backoff_cap=60.0,
+    ):
+        self.base_rate = requests_per_minute / 60.0
+        self.capacity = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._rate = self.base_rate
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+        # Télémétrie
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.throttled_seconds = 0.0
+        self.lost = Counter()
+        self.last_limits = {}
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self.requests += 1
+            wait = self._blocked_until - now
+            if self._rate > 0:
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self._rate
+                )
+                self._updated = now
+                self._tokens -= 1  # Réservation : un solde négatif se paie en attente
+                if self._tokens < 0:
+                    wait = max(wait, -self._tokens / self._rate)
+            wait = max(0.0, wait)
+            self.throttled_seconds += wait
+        if wait > 0:
+            time.sleep(wait)
+
+    def observe(self, client):
+        """Recale le débit sur praw `client.auth.limits` (en-têtes X-Ratelimit-*)."""
+        limits = getattr(getattr(client, "auth", None), "limits", None) or {}
+        remaining = limits.get("remaining")
+        reset_timestamp = limits.get("reset_timestamp")
+        if remaining is None or reset_timestamp is None:
+            return
+        seconds_left = max(1.0, reset_timestamp - time.time())
+        with self._lock:
+            self.last_limits = dict(limits)
+            if remaining < 1:
+                self._blocked_until = time.monotonic() + seconds_left
+            else:
+                server_rate = remaining / seconds_left
+                self._rate = (
+                    min(self.base_rate, server_rate) if self.base_rate else server_rate
+                )
+
+    def _backoff(self, attempt):
+        # Jitter complet : évite que tous les threads rejouent au même instant
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2**attempt))
+
+    def call(self, fn, *args, acquire=True, client=None):
+        """Exécute fn(*args) sous le budget, avec retries ; lève la dernière
+        erreur si elle n'est pas rejouable ou si les retries sont épuisés."""
+        for attempt in range(self.max_retries + 1):
+            if acquire:
+                self.acquire()
+            try:
+                result = fn(*args)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                if attempt == self.max_retries:
+                    with self._lock:
+                        self.failures += 1
+                    raise
+                delay = _retry_after(e) or self._backoff(attempt)
+                with self._lock:
+                    self.retries += 1
+                    self.throttled_seconds += delay
+                time.sleep(delay)
+                acquire = True  # Le retry est une nouvelle requête
+            else:
+                if client is not None:
+                    self.observe(client)
+                return result
+
+    def record_lost(self, kind, count=1):
+        with self._lock:
+            self.lost[kind] += count
+
+    def report(self):
+        lost = ", ".join(f"{k}={v}" for k, v in sorted(self.lost.items())) or "aucun"
+        quota = ""
+        if self.last_limits:
+            quota = (
+                f" (quota Reddit : {self.last_limits.get('used')} utilisées, "
+                f"{self.last_limits.get('remaining')} restantes)"
+            )
+        return (
+            f"Requêtes API consommées : {self.requests}{quota} | "
+            f"throttling : {self.throttled_seconds:.1f}s | "
+            f"retries : {self.retries} | abandons : {self.failures} | "
+            f"éléments perdus : {lost}"
+        )
@@ -0,0 +1,368 @@
+"""Doublures du client praw pour mesurer l'extraction sans réseau ni identifiants.
+
+- RecordingReddit : enveloppe un vrai client et enregistre listings et commentaires sur disque.
+- ReplayReddit : rejoue un enregistrement avec une latence synthétique configurable.
+- SyntheticReddit : génère à la volée des milliers de subreddits et des millions de posts.
+
+Usage : python reddit_replay.py record --subreddits datascience python --limit 100 --out cassettes
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+from types import SimpleNamespace
+
+POST_FIELDS = [
+    "id",
+    "title",
+    "selftext",
+    "score",
+    "author",
+    "created_utc",
+    "url",
+    "num_comments",
+]
+COMMENT_FIELDS = ["id", "body", "author", "score", "created_utc", "depth"]
+# Flux de commentaires d'un subreddit : le post parent est désigné par link_id
+STREAM_COMMENT_FIELDS = COMMENT_FIELDS + ["link_id"]
+
+# Une requête de listing Reddit renvoie au plus 100 éléments
+PAGE_SIZE = 100
+
+
+def _to_record(obj, fields):
+    record = {name: getattr(obj, name, None) for name in fields}
+    record["author"] = str(record["author"])
+    return record
+
+
+def _save_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class _Latency:
+    """Simule le temps d'aller-retour d'une requête HTTP."""
+
+    def __init__(self, latency=0.0, jitter=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self._rng = random.Random(seed)
+
+    def request(self):
+        self.requests += 1
+        if self.latency > 0:
+            delay = self.latency * (1 + self._rng.uniform(-self.jitter, self.jitter))
+            time.sleep(max(0.0, delay))
+
+
+# --- ENREGISTREMENT ---
+
+
+class _RecordingListing:
+    """Itérateur qui enregistre les éléments d'un listing praw au fil de la lecture.
+
+    Un itérateur plutôt qu'un générateur : une exception levée par le listing
+    (erreur réseau rejouée par _paged) laisse l'enregistrement utilisable, alors
+    qu'elle terminerait un générateur et le rejeu verrait StopIteration."""
+
+    def __init__(self, listing, fields, path):
+        self._listing = iter(listing)
+        self._fields = fields
+        self._path = path
+        self._records = []
+        self._saved = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            item = next(self._listing)
+        except StopIteration:
+            self.close()
+            raise
+        self._records.append(_to_record(item, self._fields))
+        return item
+
+    def close(self):
+        if not self._saved:
+            self._saved = True
+            _save_json(self._path, self._records)
+
+    def __del__(self):
+        # Listing interrompu (watermark) : on garde ce qui a été réellement lu
+        self.close()
+
+
+class _RecordingSubreddit:
+    def __init__(self, subreddit, cassette_dir):
+        self._subreddit = subreddit
+        self._cassette_dir = cassette_dir
+
+    def _path(self, kind):
+        return os.path.join(self._cassette_dir, kind, f"{self._subreddit}.json")
+
+    def new(self, limit=100):
+        return _RecordingListing(
+            self._subreddit.new(limit=limit), POST_FIELDS, self._path("listings")
+        )
+
+    def comments(self, limit=100):
+        return _RecordingListing(
+            self._subreddit.comments(limit=limit),
+            STREAM_COMMENT_FIELDS,
+            self._path("subreddit_comments"),
+        )
+
+
+class _RecordingComments:
+    def __init__(self, comments, path):
+        self._comments = comments
+        self._path = path
+
+    def replace_more(self, limit=0):
+        return self._comments.replace_more(limit=limit)
+
+    def list(self):
+        comments = self._comments.list()
+        _save_json(self._path, [_to_record(c, COMMENT_FIELDS) for c in comments])
+        return comments
+
+
+class _RecordingSubmission:
+    def __init__(self, submission, path):
+        self._submission = submission
+        self._path = path
+
+    def __getattr__(self, name):
+        return getattr(self._submission, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._submission, name, value)
+
+    @property
+    def comments(self):
+        return _RecordingComments(self._submission.comments, self._path)
+
+
+class RecordingReddit:
+    """Enveloppe un praw.Reddit et enregistre chaque réponse dans cassette_dir."""
+
+    def __init__(self, reddit, cassette_dir):
+        self._reddit = reddit
+        self.cassette_dir = cassette_dir
+
+    def subreddit(self, name):
+        return _RecordingSubreddit(self._reddit.subreddit(name), self.cassette_dir)
+
+    def submission(self, id):
+        path = os.path.join(self.cassette_dir, "comments", f"{id}.json")
+        return _RecordingSubmission(self._reddit.submission(id=id), path)
+
+
+# --- REJEU ---
+
+
+class _ReplaySubmission:
+    def __init__(self, id, loader, latency):
+        self.id = id
+        self.comment_sort = "confidence"
+        self.comment_limit = None
+        self._loader = loader
+        self._latency = latency
+        self._comments = None
+
+    @property
+    def comments(self):
+        # Comme praw : l'arbre de commentaires est chargé au premier accès
+        if self._comments is None:
+            self._latency.request()
+            records = self._loader(self.id)
+            if self.comment_limit is not None:
+                records = records[: self.comment_limit]
+            self._comments = SimpleNamespace(
+                replace_more=lambda limit=0: [],
+                list=lambda: [SimpleNamespace(**r) for r in records],
+            )
+        return self._comments
+
+
+class _ReplaySubreddit:
+    def __init__(self, name, posts_loader, comments_loader, latency):
+        self.display_name = name
+        self._posts_loader = posts_loader
+        self._comments_loader = comments_loader
+        self._latency = latency
+
+    def __str__(self):
+        return self.display_name
+
+    def _replay(self, records, limit):
+        for i, record in enumerate(itertools.islice(records, limit)):
+            if i % PAGE_SIZE == 0:
+                self._latency.request()
+            yield SimpleNamespace(**record)
+
+    def new(self, limit=100):
+        return self._replay(self._posts_loader(self.display_name), limit)
+
+    def comments(self, limit=100):
+        return self._replay(self._comments_loader(self.display_name), limit)
+
+
+class ReplayReddit:
+    """Rejoue un enregistrement RecordingReddit ; latency en secondes par requête."""
+
+    def __init__(self, cassette_dir, latency=0.0, jitter=0.0, seed=None):
+        self.cassette_dir = cassette_dir
+        self.latency = _Latency(latency, jitter, seed)
+
+    def _load(self, kind, name):
+        path = os.path.join(self.cassette_dir, kind, f"{name}.json")
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def subreddits(self):
+        listings = os.path.join(self.cassette_dir, "listings")
+        return sorted(os.path.splitext(f)[0] for f in os.listdir(listings))
+
+    def subreddit(self, name):
+        return _ReplaySubreddit(
+            name,
+            lambda n: self._load("listings", n),
+            lambda n: self._load("subreddit_comments", n),
+            self.latency,
+        )
+
+    def submission(self, id):
+        return _ReplaySubmission(id, lambda i: self._load("comments", i), self.latency)
+
+
+# --- GÉNÉRATION SYNTHÉTIQUE ---
+
+
+WORDS = (
+    "data python spark model great bad good love hate release bug feature "
+    "question help update performance slow fast awesome terrible price launch"
+).split()
+
+
+class SyntheticReddit(ReplayReddit):
+    """Génère des données déterministes sans rien stocker : le volume simulé
+    (subreddits x posts) n'est limité que par le temps d'extraction."""
+
+    BASE_UTC = 1_700_000_000.0
+
+    def __init__(
+        self,
+        num_subreddits=1000,
+        posts_per_subreddit=1000,
+        comments_per_post=10,
+        latency=0.0,
+        jitter=0.0,
+        seed=0,
+    ):
+        self.num_subreddits = num_subreddits
+        self.posts_per_subreddit = posts_per_subreddit
+        self.comments_per_post = comments_per_post
+        self.seed = seed
+        self.latency = _Latency(latency, jitter, seed)
+
+    def subreddits(self):
+        return [f"synth{i:05d}" for i in range(self.num_subreddits)]
+
+    def _text(self, rng, n_words):
+        return " ".join(rng.choice(WORDS) for _ in range(n_words))
+
+    def _posts(self, name):
+        for i in range(self.posts_per_subreddit):
+            post_id = f"{name}_{i}"
+            rng = random.Random(f"{self.seed}:{post_id}")
+            yield {
+                "id": post_id,
+                "title": self._text(rng, 8),
+                "selftext": self._text(rng, 40),
+                "score": rng.randint(0, 5000),
+                "author": f"user{rng.randint(0, 99999)}",
+                # Du plus récent au plus ancien, comme subreddit.new()
+                "created_utc": self.BASE_UTC - i * 60,
+                "url": f"https://www.reddit.com/r/{name}/comments/{post_id}",
+                "num_comments": self.comments_per_post,
+            }
+
+    def _comments(self, post_id):
+        rng = random.Random(f"{self.seed}:{post_id}:comments")
+        return [
+            {
+                "id": f"{post_id}_c{j}",
+                "body": self._text(rng, 20),
+                "author": f"user{rng.randint(0, 99999)}",
+                "score": rng.randint(-20, 500),
+                "created_utc": self.BASE_UTC + j * 30,
+                "depth": 0 if j % 3 == 0 else 1,
+            }
+            for j in range(self.comments_per_post)
+        ]
+
+    def _subreddit_comments(self, name):
+        # Flux du plus récent au plus ancien, réparti sur les posts du subreddit
+        total = self.posts_per_subreddit * self.comments_per_post
+        for k in range(total):
+            post_id = f"{name}_{k // self.comments_per_post}"
+            rng = random.Random(f"{self.seed}:{name}:stream:{k}")
+            yield {
+                "id": f"{name}_s{k}",
+                "body": self._text(rng, 20),
+                "author": f"user{rng.randint(0, 99999)}",
+                "score": rng.randint(-20, 500),
+                "created_utc": self.BASE_UTC - k * 6,
+                "depth": 0,
+                "link_id": f"t3_{post_id}",
+            }
+
+    def subreddit(self, name):
+        return _ReplaySubreddit(
+            name, self._posts, self._subreddit_comments, self.latency
+        )
+
+    def submission(self, id):
+        return _ReplaySubmission(id, self._comments, self.latency)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record = subparsers.add_parser(
+        "record", help="Enregistre de vraies réponses Reddit"
+    )
+    record.add_argument("--subreddits", nargs="+", default=["datascience"])
+    record.add_argument("--limit", type=int, default=100)
+    record.add_argument("--comments_limit", type=int, default=5)
+    record.add_argument("--out", default="cassettes")
+    args = parser.parse_args()
+
+    from extraction_reddit import create_reddit_client, extract_reddit_data
+
+    df_posts, df_comments = extract_reddit_data(
+        args.subreddits,
+        args.limit,
+        args.comments_limit,
+        client_factory=lambda: RecordingReddit(create_reddit_client(), args.out),
+    )
+    if df_posts is not None:
+        print(
+            f"Enregistré dans {args.out} : {len(df_posts)} posts, {len(df_comments)} commentaires"
+        )
@@ -0,0 +1,133 @@
+import hashlib
+import math
+import os
+import sqlite3
+
+SEEN_INDEX_PATH = os.getenv("SEEN_INDEX_PATH", "seen_index.db")
+
+# Préfixes des fullnames Reddit : un même id ne peut pas désigner un post et un commentaire
+FULLNAME_PREFIXES = {"post": "t3_", "comment": "t1_"}
+
+
+def fullname(kind, record_id):
+    return f"{FULLNAME_PREFIXES[kind]}{record_id}"
+
+
+class BloomFilter:
+    """Filtre de Bloom : « absent » est certain, « présent » doit être vérifié."""
+
+    def __init__(self, capacity, error_rate=0.01, bits=None, count=0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray((self.size + 7) // 8)
+        self.count = count
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(
+            self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key)
+        )
+
+
+class SeenIndex:
+    """Index persistant (SQLite) des ids de posts et commentaires déjà ingérés.
+
+    Un filtre de Bloom en mémoire répond sans accès disque pour les ids nouveaux
+    (le cas courant) ; seuls ses positifs sont confirmés par la table SQLite.
+    Les ids ajoutés restent en attente jusqu'à commit(), à appeler une fois les
+    données correspondantes écrites sur disque.
+    """
+
+    def __init__(self, path=SEEN_INDEX_PATH, capacity=20_000_000, error_rate=0.01):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen_ids (fullname TEXT PRIMARY KEY) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS bloom "
+            "(id INTEGER PRIMARY KEY CHECK (id = 0), capacity INTEGER, "
+            "error_rate REAL, count INTEGER, bits BLOB)"
+        )
+        self._pending = set()
+        self._bloom = self._load_bloom(capacity, error_rate)
+
+    def _load_bloom(self, capacity, error_rate):
+        total = self._conn.execute("SELECT count(*) FROM seen_ids").fetchone()[0]
+        row = self._conn.execute(
+            "SELECT capacity, error_rate, count, bits FROM bloom WHERE id = 0"
+        ).fetchone()
+        if row and row[2] == total and total <= row[0]:
+            return BloomFilter(row[0], row[1], bytearray(row[3]), row[2])
+
+        # Filtre absent, saturé ou désynchronisé (arrêt brutal) : reconstruction
+        bloom = BloomFilter(max(capacity, total * 2), error_rate)
+        for (name,) in self._conn.execute("SELECT fullname FROM seen_ids"):
+            bloom.add(name)
+        return bloom
+
+    def contains(self, name):
+        if name in self._pending:
+            return True
+        if name not in self._bloom:
+            return False
+        return (
+            self._conn.execute(
+                "SELECT 1 FROM seen_ids WHERE fullname = ?", (name,)
+            ).fetchone()
+            is not None
+        )
+
+    def add(self, name):
+        self._pending.add(name)
+
+    def check_and_add(self, kind, record_id):
+        """True si l'id est nouveau (et le réserve), False s'il a déjà été vu."""
+        name = fullname(kind, record_id)
+        if self.contains(name):
+            return False
+        self.add(name)
+        return True
+
+    def commit(self):
+        if not self._pending:
+            return
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO seen_ids (fullname) VALUES (?)",
+                ((name,) for name in self._pending),
+            )
+        for name in self._pending:
+            self._bloom.add(name)
+        self._pending.clear()
+
+    def rollback(self):
+        """Oublie les ids en attente (données non persistées, à ré-extraire)."""
+        self._pending.clear()
+
+    def close(self):
+        """Ferme l'index sans valider les ids en attente : leurs données n'ont
+        pas été confirmées sur disque (interruption, erreur d'écriture)."""
+        self.rollback()
+        bloom = self._bloom
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO bloom (id, capacity, error_rate, count, bits) "
+                "VALUES (0, ?, ?, ?, ?)",
+                (bloom.capacity, bloom.error_rate, bloom.count, bytes(bloom.bits)),
+            )
+        self._conn.close()
@@ -1,118 +1,846 @@
-from pyspark.sql import SparkSession
-from pyspark.sql.functions import col, udf, expr
-from pyspark.sql.types import StringType, FloatType
+from pyspark import StorageLevel
+from pyspark.sql import DataFrame, SparkSession
+from pyspark.sql.functions import (
+    coalesce,
+    col,
+    input_file_name,
+    lit,
+    lower,
+    monotonically_increasing_id,
+    pandas_udf,
+    regexp_replace,
+    when,
+)
+from pyspark.sql.types import (
+    DoubleType,
+    FloatType,
+    LongType,
+    StringType,
+    StructField,
+    StructType,
+)
+import argparse
+import functools
+import json
 import sys
- # import inutilisé supprimé
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from itertools import islice
+from urllib.parse import urlparse
+
+import pandas as pd
+
+from upsert_sql import LOAD_ORDER_COLUMN, stats_statements, upsert_statements
+
+# Chargement par COPY FROM STDIN (optionnel : sinon écritures JDBC)
+try:
+    import psycopg2
+
+    PSYCOPG2_AVAILABLE = True
+except ImportError:
+    PSYCOPG2_AVAILABLE = False
 
 # Configuration Spark
 spark = (
     SparkSession.builder.appName("RedditProcessing")
     .config("spark.jars.packages", "org.postgresql:postgresql:42.2.18")
+    # Partitions Parquet (subreddit=..., date=...) lues comme chaînes : pas d'inférence
+    .config("spark.sql.sources.partitionColumnTypeInference.enabled", "false")
     .getOrCreate()
 )
 
+# Schémas déclarés des données brutes (types de l'extracteur) : ni inférence
+# ni cast texte à la lecture
+POST_SCHEMA = StructType(
+    [
+        StructField("id", StringType()),
+        StructField("title", StringType()),
+        StructField("body", StringType()),
+        StructField("score", LongType()),
+        StructField("author", StringType()),
+        StructField("created_utc", DoubleType()),
+        StructField("subreddit", StringType()),
+        StructField("url", StringType()),
+        StructField("num_comments", LongType()),
+    ]
+)
+COMMENT_SCHEMA = StructType(
+    [
+        StructField("id", StringType()),
+        StructField("post_id", StringType()),
+        StructField("body", StringType()),
+        StructField("author", StringType()),
+        StructField("score", LongType()),
+        StructField("created_utc", DoubleType()),
+        StructField("subreddit", StringType()),
+    ]
+)
+RAW_SCHEMAS = {"posts": POST_SCHEMA, "comments": COMMENT_SCHEMA}
 
-def clean_text(text):
-    if text is None:
-        return ""
-    # Simple cleaning example
-    return text.lower().strip()
+# Ligne CSV mal formée (texte brut) et fichier d'origine, écartées en quarantaine
+CORRUPT_COLUMN = "_corrupt_record"
+SOURCE_FILE_COLUMN = "_source_file"
 
+# Manifeste des runs d'extraction publiés (un JSON par run, cf. hdfs_writer.py)
+RUNS_MANIFEST_DIR = "_runs"
 
-def analyze_sentiment(text):
-    # Utilisation de TextBlob pour une vraie analyse de sentiment
-    # Retourne un score entre -1.0 (Négatif) et 1.0 (Positif)
-    try:
-        from textblob import TextBlob
+# Registre des runs déjà écrits dans PostgreSQL (un JSON par exécution du job)
+LEDGER_DIR = "_processed"
 
-        if not text:
-            return 0.0
-        return float(TextBlob(text).sentiment.polarity)
+
+def path_exists(path):
+    """Teste l'existence d'un chemin HDFS via l'API Hadoop de la JVM."""
+    jvm_path = spark._jvm.org.apache.hadoop.fs.Path(path)
+    fs = jvm_path.getFileSystem(spark._jsc.hadoopConfiguration())
+    return fs.exists(jvm_path)
+
+
+def list_runs(hdfs_dir):
+    """Runs publiés au manifeste, du plus ancien au plus récent ; None si le
+    dossier HDFS n'a pas de manifeste (ancienne disposition posts.csv).
+    Les runs fusionnés par compact_runs.py sont masqués par le run compacté."""
+    manifest_path = f"{hdfs_dir}/{RUNS_MANIFEST_DIR}"
+    if not path_exists(manifest_path):
+        return None
+    runs = [
+        row.asDict(recursive=True) for row in spark.read.json(manifest_path).collect()
+    ]
+    superseded = {
+        run_id for run in runs for run_id in (run.get("compacted_from") or [])
+    }
+    return sorted(
+        (run for run in runs if run["run_id"] not in superseded),
+        key=lambda run: run["run_id"],
+    )
+
+
+def write_json(path, entry):
+    """Publie un fichier JSON d'une ligne sur HDFS en une opération : écrit
+    sous un nom caché puis renommé (jamais lu à moitié écrit)."""
+    parent, file_name = path.rsplit("/", 1)
+    jvm_path = spark._jvm.org.apache.hadoop.fs.Path(path)
+    fs = jvm_path.getFileSystem(spark._jsc.hadoopConfiguration())
+    tmp = spark._jvm.org.apache.hadoop.fs.Path(f"{parent}/_{file_name}.tmp")
+    out = fs.create(tmp, True)
+    out.write(bytearray((json.dumps(entry) + "\n").encode("utf-8")))
+    out.close()
+    if not fs.rename(tmp, jvm_path):
+        raise IOError(f"Publication impossible : {path}")
+
+
+def processed_runs(hdfs_dir):
+    """run_id déjà traités d'après le registre <hdfs_dir>/_processed/."""
+    ledger_path = f"{hdfs_dir}/{LEDGER_DIR}"
+    if not path_exists(ledger_path):
+        return set()
+    return {
+        run_id
+        for row in spark.read.json(ledger_path).select("runs").collect()
+        for run_id in row["runs"] or []
+    }
+
+
+def is_processed(run, processed):
+    """Un run compacté est traité si tous les runs qu'il remplace l'étaient."""
+    sources = run.get("compacted_from")
+    if sources:
+        return all(run_id in processed for run_id in sources)
+    return run["run_id"] in processed
+
+
+def record_processed(hdfs_dir, runs, rows, **info):
+    """Ajoute au registre les runs écrits dans PostgreSQL (appelé après succès)."""
+    processed_at = datetime.now(timezone.utc)
+    write_json(
+        f"{hdfs_dir}/{LEDGER_DIR}/{processed_at:%Y%m%dT%H%M%S%f}Z.json",
+        {
+            "runs": [run["run_id"] for run in runs],
+            "rows": rows,
+            "processed_at": processed_at.isoformat(),
+            **info,
+        },
+    )
+
+
+def select_runs(runs, selection, processed=frozenset()):
+    """selection : ["new"] (runs absents du registre processed), ["latest"],
+    ["all"] ou une liste de run_id."""
+    if "all" in selection:
+        return runs
+    if "new" in selection:
+        return [run for run in runs if not is_processed(run, processed)]
+    if "latest" in selection:
+        return runs[-1:]
+    return [run for run in runs if run["run_id"] in selection]
+
+
+def _with_quarantine_columns(schema):
+    return StructType(
+        schema.fields
+        + [
+            StructField(CORRUPT_COLUMN, StringType()),
+            StructField(SOURCE_FILE_COLUMN, StringType()),
+        ]
+    )
+
+
+def _read_parquet(paths, schema, since, base_path=None):
+    # Format colonnaire déjà typé : rien à parser, aucune ligne mal formée
+    reader = spark.read.schema(schema)
+    if base_path:
+        reader = reader.option("basePath", base_path)
+    df = reader.parquet(*paths)
+    if since:
+        # Filtre sur la colonne de partition : les dossiers plus anciens sont ignorés
+        df = df.where(col("date") >= since)
+    return df.select(
+        *schema.fieldNames(),
+        lit(None).cast("string").alias(CORRUPT_COLUMN),
+        lit(None).cast("string").alias(SOURCE_FILE_COLUMN),
+    )
+
+
+def _csv_reader(reader, schema):
+    # Fichiers .gz / .zst décodés par les codecs Hadoop (membres ou trames concaténés).
+    # Une valeur qui ne respecte pas le schéma passe à null et la ligne brute
+    # est conservée dans CORRUPT_COLUMN au lieu de faire échouer le job.
+    return (
+        reader.schema(
+            StructType(schema.fields + [StructField(CORRUPT_COLUMN, StringType())])
+        )
+        .option("header", "true")
+        .option("enforceSchema", "false")
+        .option("multiLine", "true")
+        .option("escape", '"')
+        .option("mode", "PERMISSIVE")
+        .option("columnNameOfCorruptRecord", CORRUPT_COLUMN)
+    )
+
+
+def _with_source_file(df):
+    return df.withColumn(
+        SOURCE_FILE_COLUMN,
+        when(col(CORRUPT_COLUMN).isNotNull(), input_file_name()),
+    )
+
+
+def _read_csv(paths, schema):
+    return _with_source_file(_csv_reader(spark.read, schema).csv(paths))
+
+
+def read_runs(hdfs_dir, name, runs, since=None):
+    """Lit en un seul job les partitions <hdfs_dir>/<name>/ingest_date=.../run_id=...
+    des runs donnés, chacune dans son format (Parquet, CSV compressé ou non)."""
+    schema = RAW_SCHEMAS[name]
+    paths = {"csv": [], "parquet": []}
+    for run in runs:
+        path = (
+            f"{hdfs_dir}/{name}/ingest_date={run['ingest_date']}/run_id={run['run_id']}"
+        )
+        if path_exists(path):
+            paths[run["format"]].append(path)
+    print(
+        f"Lecture de {name} : {len(paths['parquet'])} partition(s) Parquet, "
+        f"{len(paths['csv'])} partition(s) CSV..."
+    )
+
+    frames = []
+    if paths["parquet"]:
+        frames.append(
+            _read_parquet(paths["parquet"], schema, since, f"{hdfs_dir}/{name}")
+        )
+    if paths["csv"]:
+        frames.append(_read_csv(paths["csv"], schema))
+    if not frames:
+        return spark.createDataFrame([], _with_quarantine_columns(schema))
+    return functools.reduce(DataFrame.unionByName, frames)
+
+
+def read_raw(hdfs_dir, name, since=None, runs=None):
+    """Données brutes typées selon RAW_SCHEMAS[name], plus CORRUPT_COLUMN et
+    SOURCE_FILE_COLUMN (renseignées pour les lignes CSV mal formées).
+
+    Lit les runs donnés (voir read_runs) ; sans manifeste, lit <hdfs_dir>/<name>/
+    (Parquet partitionné par subreddit et date) s'il existe, sinon
+    <hdfs_dir>/<name>.csv[.gz|.zst]."""
+    if runs is not None:
+        return read_runs(hdfs_dir, name, runs, since)
+
+    schema = RAW_SCHEMAS[name]
+    parquet_path = f"{hdfs_dir}/{name}"
+    if path_exists(parquet_path):
+        print(f"Lecture Parquet ({parquet_path})...")
+        return _read_parquet([parquet_path], schema, since)
+
+    # posts.csv, posts.csv.gz ou posts.csv.zst : Spark décompresse selon l'extension
+    csv_path = f"{hdfs_dir}/{name}.csv*"
+    print(f"Lecture CSV ({csv_path})...")
+    return _read_csv(csv_path, schema)
+
+
+def quarantine(df, quarantine_dir, name, batch_id=None):
+    """Écrit les lignes mal formées de df (ligne brute et fichier source) en
+    JSON dans <quarantine_dir>/<name>/quarantined_at=<horodatage UTC>/.
+
+    Micro-batch du mode streaming : <quarantine_dir>/stream/<name>/batch_id=<id>/,
+    remplacé si le batch est rejoué."""
+    if batch_id is None:
+        path = (
+            f"{quarantine_dir}/{name}/"
+            f"quarantined_at={datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}"
+        )
+        mode = "append"
+    else:
+        path = f"{quarantine_dir}/stream/{name}/batch_id={batch_id}"
+        mode = "overwrite"
+    df.where(col(CORRUPT_COLUMN).isNotNull()).select(
+        CORRUPT_COLUMN, SOURCE_FILE_COLUMN
+    ).write.mode(mode).json(path)
+    return path
+
+
+# Règles de normalisation du texte, appliquées dans cet ordre par des fonctions
+# Spark natives : le texte ne quitte la JVM que pour le scoring de sentiment.
+# Règle : liste de (motif regex Java, remplacement) ; lower : fonction native.
+TEXT_RULES = {
+    # &amp; en dernier : « &amp;lt; » redonne « &lt; » et non « < »
+    "html_entities": [
+        ("&lt;", "<"),
+        ("&gt;", ">"),
+        ("&quot;", '"'),
+        ("&#0?39;", "'"),
+        ("&nbsp;", " "),
+        ("&amp;", "&"),
+    ],
+    "markdown": [
+        # [texte](lien) -> texte ; emphase, barré, code ; titres et citations
+        (r"\[([^\]]*)\]\([^)]*\)", "$1"),
+        (r"\*{1,3}|~~|`+", ""),
+        (r"(?m)^[ \t]*(#{1,6}|>+)[ \t]*", ""),
+    ],
+    # Après markdown : le lien d'un [texte](lien) a déjà disparu avec sa syntaxe
+    "urls": [(r"https?://\S+|www\.\S+", " ")],
+    "whitespace": [(r"(?U)\s+", " ")],
+    "lower": None,
+    # Espaces Unicode et séparateurs \x1c-\x1f : mêmes caractères que str.strip()
+    "trim": [(r"(?U)^[\s\x1c-\x1f]+|[\s\x1c-\x1f]+$", "")],
+}
+
+# Résultat identique à l'ancienne UDF clean_text : text.lower().strip()
+DEFAULT_TEXT_RULES = ["lower", "trim"]
+
+
+def normalize_text(column, rules=DEFAULT_TEXT_RULES):
+    """Expression Spark native normalisant une colonne texte (None -> "")
+    selon les règles de TEXT_RULES demandées, toujours dans l'ordre de TEXT_RULES."""
+    unknown = set(rules) - set(TEXT_RULES)
+    if unknown:
+        raise ValueError(f"Règles de normalisation inconnues : {sorted(unknown)}")
+    text = coalesce(column, lit(""))
+    for name, replacements in TEXT_RULES.items():
+        if name not in rules:
+            continue
+        if name == "lower":
+            text = lower(text)
+            continue
+        for pattern, replacement in replacements:
+            text = regexp_replace(text, pattern, replacement)
+    return text
+
+
+def _polarity_scorer():
+    """Fonction texte -> polarité TextBlob, de -1.0 (Négatif) à 1.0 (Positif).
+
+    Même calcul que TextBlob(text).sentiment.polarity, sans construire de blob
+    par texte. Le lexique est chargé au premier appel puis conservé par le
+    module textblob : une fois par worker Python, pas une fois par ligne."""
+    try:
+        from textblob.en.sentiments import PatternAnalyzer
     except ImportError:
         # Fallback si TextBlob n'est pas installé
-        if not text:
+        return lambda text: 0.5 if "good" in text else -0.5 if "bad" in text else 0.0
+    analyze = PatternAnalyzer().analyze
+    return lambda text: analyze(text).polarity
+
+
+def analyze_sentiment(texts: pd.Series) -> pd.Series:
+    """Polarité de chaque texte d'un batch Arrow (0.0 si vide ou en erreur)."""
+    polarity = _polarity_scorer()
+
+    def score(text):
+        # None arrive en NaN selon la version de pandas
+        if not isinstance(text, str) or not text:
+            return 0.0
+        try:
+            return float(polarity(text))
+        except Exception:
             return 0.0
-        return 0.5 if "good" in text else -0.5 if "bad" in text else 0.0
-    except Exception:
-        return 0.0
 
+    return texts.map(score).astype("float32")
 
-import traceback
+
+# Batches Arrow (spark.sql.execution.arrow.maxRecordsPerBatch lignes) au lieu
+# d'un aller-retour Python par ligne
+sentiment_udf = pandas_udf(analyze_sentiment, FloatType())
 
 
-def process_data(hdfs_dir, db_url, db_props):
+def score_text(df, text_rules=DEFAULT_TEXT_RULES):
+    """Colonnes calculées (clean_body, sentiment) et types des tables PostgreSQL."""
+    df = (
+        df.withColumn("clean_body", normalize_text(col("body"), text_rules))
+        .withColumn("sentiment", sentiment_udf(col("clean_body")))
+        .withColumn("score", col("score").cast("float"))
+        # created_utc reste textuel dans PostgreSQL (compatibilité avec l'ingestion CSV)
+        .withColumn(
+            "created_utc", col("created_utc").cast("decimal(20,1)").cast("string")
+        )
+    )
+    if "num_comments" in df.columns:
+        df = df.withColumn("num_comments", col("num_comments").cast("int"))
+    return df
+
+
+def count_rows(datasets):
+    """{(dataset, mal formée): lignes} de tous les DataFrames en un seul job :
+    chaque entrée est lue, parsée et scorée une fois (et mise en cache si
+    persistée)."""
+    tallies = functools.reduce(
+        DataFrame.unionByName,
+        [
+            df.select(
+                lit(name).alias("dataset"),
+                col(CORRUPT_COLUMN).isNotNull().alias("corrupt"),
+            )
+            for name, df in datasets.items()
+        ],
+    )
+    counts = {(name, corrupt): 0 for name in datasets for corrupt in (False, True)}
+    for row in tallies.groupBy("dataset", "corrupt").count().collect():
+        counts[(row["dataset"], row["corrupt"])] = row["count"]
+    return counts
+
+
+TABLES = {"posts": "reddit_posts", "comments": "reddit_comments"}
+
+
+def execute_sql(db_url, db_props, statements):
+    """Exécute les requêtes dans une seule transaction PostgreSQL, depuis le
+    driver Spark, avec le driver JDBC déjà chargé pour les écritures."""
+    jvm = spark._jvm
+    # Rend le driver de --packages visible de DriverManager (comme les sources JDBC)
+    jvm.org.apache.spark.sql.execution.datasources.jdbc.DriverRegistry.register(
+        db_props["driver"]
+    )
+    props = jvm.java.util.Properties()
+    for key, value in db_props.items():
+        props.setProperty(key, value)
+    connection = jvm.java.sql.DriverManager.getConnection(db_url, props)
     try:
-        print(f"Lecture depuis le dossier HDFS : {hdfs_dir}")
+        connection.setAutoCommit(False)
+        statement = connection.createStatement()
+        for sql in statements:
+            statement.execute(sql)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def read_stream(hdfs_dir, name, max_files_per_trigger=None):
+    """Flux des fichiers déposés dans les partitions de runs
+    <hdfs_dir>/<name>/ingest_date=.../run_id=... (CSV compressé ou non et
+    Parquet), mêmes colonnes que read_raw. Les fichiers en cours d'envoi
+    (._COPYING_) sont ignorés par la source fichier de Spark."""
+    schema = RAW_SCHEMAS[name]
+    base_path = f"{hdfs_dir}/{name}"
+    run_glob = f"{base_path}/ingest_date=*/run_id=*"
 
-        # --- TRAITEMENT DES POSTS ---
-        posts_path = f"{hdfs_dir}/posts.csv"
-        print(f"Lecture des Posts ({posts_path})...")
+    def reader():
+        reader = spark.readStream.option("basePath", base_path)
+        if max_files_per_trigger:
+            reader = reader.option("maxFilesPerTrigger", max_files_per_trigger)
+        return reader
 
-        df_posts = (
-            spark.read.option("header", "true")
-            .option("multiLine", "true")
-            .option("escape", '"')
-            .csv(posts_path)
+    csv = _with_source_file(_csv_reader(reader(), schema).csv(f"{run_glob}/*.csv*"))
+    # subreddit vient du chemin des fichiers Parquet (partition subreddit=...)
+    parquet = (
+        reader()
+        .schema(schema)
+        .parquet(f"{run_glob}/subreddit=*/date=*/*.parquet")
+        .select(
+            *schema.fieldNames(),
+            lit(None).cast("string").alias(CORRUPT_COLUMN),
+            lit(None).cast("string").alias(SOURCE_FILE_COLUMN),
         )
+    )
+    return csv.select(*parquet.columns).unionByName(parquet)
 
-        if df_posts.count() > 0:
-            clean_udf = udf(clean_text, StringType())
-            sent_udf = udf(analyze_sentiment, FloatType())
 
-            df_posts_clean = (
-                df_posts.withColumn("clean_body", clean_udf(col("body")))
-                .withColumn("sentiment", sent_udf(col("clean_body")))
-                .withColumn("score", expr("try_cast(score as float)"))
-                .withColumn("num_comments", expr("try_cast(num_comments as int)"))
-            )
+# Lignes envoyées au serveur par écriture (COPY) ou par requête batchée (JDBC)
+LOAD_BATCH_SIZE = 10000
+
+
+def _copy_field(value):
+    # CSV de COPY : champ vide non quoté = NULL, tout le reste entre guillemets
+    if value is None:
+        return ""
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+class _CopyBatches:
+    """Fichier lu par copy_expert : chaque read() renvoie le CSV des
+    batch_size lignes suivantes, sans matérialiser la partition."""
+
+    def __init__(self, rows, batch_size):
+        self.rows = iter(rows)
+        self.batch_size = batch_size
+        self.count = 0
+
+    def read(self, size=-1):
+        batch = list(islice(self.rows, self.batch_size))
+        self.count += len(batch)
+        return "".join(",".join(map(_copy_field, row)) + "\n" for row in batch)
+
+
+def _pg_connect_args(db_url, db_props):
+    """Paramètres psycopg2 équivalents à l'URL JDBC jdbc:postgresql://hôte:port/base."""
+    url = urlparse(db_url[len("jdbc:") :])
+    return {
+        "host": url.hostname,
+        "port": url.port or 5432,
+        "dbname": url.path.lstrip("/"),
+        "user": db_props["user"],
+        "password": db_props["password"],
+    }
+
+
+def _copy_partitions(connect_args, staging, columns, batch_size):
+    """Fonction mapPartitionsWithIndex : COPY de la partition dans staging
+    (une connexion et une transaction par partition), puis (index, lignes,
+    secondes) pour le rapport de débit."""
+    names = ", ".join(f'"{c}"' for c in columns)
+    sql = f"COPY {staging} ({names}) FROM STDIN WITH (FORMAT csv)"
+
+    def copy(index, rows):
+        start = time.perf_counter()
+        batches = _CopyBatches(rows, batch_size)
+        connection = psycopg2.connect(**connect_args)
+        try:
+            with connection, connection.cursor() as cursor:
+                cursor.copy_expert(sql, batches, size=batch_size)
+        finally:
+            connection.close()
+        yield index, batches.count, time.perf_counter() - start
+
+    return copy
 
-            # Stats par subreddit
-            df_stats = df_posts_clean.groupBy("subreddit").avg(
-                "score", "sentiment", "num_comments"
+
+def copy_dataframe(df, staging, db_url, db_props, writers=None, batch_size=None):
+    """Remplit staging (vidée, créée si besoin avec le schéma de df) par COPY
+    FROM STDIN depuis les exécuteurs : writers connexions en parallèle (défaut
+    : une par partition de df). Affiche le débit de chaque partition."""
+    batch_size = batch_size or LOAD_BATCH_SIZE
+    df.limit(0).write.option("truncate", "true").jdbc(
+        url=db_url, table=staging, mode="overwrite", properties=db_props
+    )
+    if writers:
+        # Moins d'écrivains que de partitions : regroupement sans shuffle
+        if writers < df.rdd.getNumPartitions():
+            df = df.coalesce(writers)
+        else:
+            df = df.repartition(writers)
+    start = time.perf_counter()
+    reports = df.rdd.mapPartitionsWithIndex(
+        _copy_partitions(
+            _pg_connect_args(db_url, db_props), staging, df.columns, batch_size
+        )
+    ).collect()
+    elapsed = time.perf_counter() - start
+    for index, rows, seconds in sorted(reports):
+        print(
+            f"COPY {staging} partition {index} : {rows} ligne(s) en {seconds:.1f}s "
+            f"({rows / max(seconds, 1e-9):.0f} lignes/s)"
+        )
+    total = sum(rows for _, rows, _ in reports)
+    print(
+        f"COPY {staging} : {total} ligne(s), {len(reports)} écrivain(s), "
+        f"{total / max(elapsed, 1e-9):.0f} lignes/s"
+    )
+
+
+def load_table(
+    df,
+    table,
+    db_url,
+    db_props,
+    staging=None,
+    replace=False,
+    before=(),
+    after=(),
+    loader="copy",
+    writers=None,
+    batch_size=None,
+):
+    """Charge df dans une table de staging (remplacée à chaque appel) puis la
+    fusionne dans table en une transaction (upsert_statements), précédée des
+    requêtes before et suivie des requêtes after.
+
+    loader : "copy" (COPY FROM STDIN, psycopg2 requis) ou "jdbc" (écritures
+    JDBC en requêtes batchées). writers : connexions parallèles ; batch_size :
+    lignes par envoi."""
+    staging = staging or f"{table}_staging"
+    columns = df.columns
+    # Index de partition et rang dans la partition : l'ordre de df, calculé
+    # avant la répartition entre écrivains
+    df = df.withColumn(LOAD_ORDER_COLUMN, monotonically_increasing_id())
+    # Staging créée avant LOAD_ORDER_COLUMN : vidée mais pas recréée par Spark
+    execute_sql(
+        db_url,
+        db_props,
+        [
+            f"ALTER TABLE IF EXISTS {staging} "
+            f"ADD COLUMN IF NOT EXISTS {LOAD_ORDER_COLUMN} BIGINT"
+        ],
+    )
+    if loader == "copy":
+        copy_dataframe(df, staging, db_url, db_props, writers, batch_size)
+    else:
+        writer = (
+            df.write.option("truncate", "true").option(
+                "batchsize", batch_size or LOAD_BATCH_SIZE
             )
+            # INSERT multi-lignes au lieu d'une requête par ligne du batch
+            .option("reWriteBatchedInserts", "true")
+        )
+        if writers:
+            writer = writer.option("numPartitions", writers)
+        writer.jdbc(url=db_url, table=staging, mode="overwrite", properties=db_props)
+    execute_sql(
+        db_url,
+        db_props,
+        upsert_statements(table, staging, columns, replace, list(before)) + list(after),
+    )
+
+
+def stream_batch_writer(
+    name,
+    db_url,
+    db_props,
+    text_rules=DEFAULT_TEXT_RULES,
+    quarantine_dir=None,
+    load_options=None,
+):
+    """Fonction foreachBatch : mêmes étapes que process_data sur chaque
+    micro-batch, puis écriture idempotente dans PostgreSQL.
 
-            print("Écriture Posts dans PostgreSQL...")
-            df_posts_clean.write.jdbc(
-                url=db_url, table="reddit_posts", mode="append", properties=db_props
+    Le batch scoré est fusionné dans la table cible (load_table, avec
+    load_options : loader, writers, batch_size) et dans les stats par
+    subreddit, dans la même transaction : un batch rejoué après un échec ne
+    duplique rien."""
+    table = TABLES[name]
+    staging = f"{table}_stream_staging"
+
+    def write_batch(batch_df, batch_id):
+        cached = batch_df.persist(StorageLevel.MEMORY_AND_DISK)
+        try:
+            counts = count_rows({name: cached})
+            if counts[(name, True)]:
+                path = quarantine(cached, quarantine_dir, name, batch_id)
+                print(
+                    f"Batch {batch_id} {name} : {counts[(name, True)]} "
+                    f"ligne(s) mal formée(s) -> {path}"
+                )
+            if not counts[(name, False)]:
+                return
+            df = score_text(
+                cached.where(col(CORRUPT_COLUMN).isNull()).drop(
+                    CORRUPT_COLUMN, SOURCE_FILE_COLUMN
+                ),
+                text_rules,
             )
-            df_stats.write.jdbc(
-                url=db_url, table="reddit_stats", mode="overwrite", properties=db_props
+            before, after = stats_statements(staging) if name == "posts" else ((), ())
+            load_table(
+                df,
+                table,
+                db_url,
+                db_props,
+                staging=staging,
+                before=before,
+                after=after,
+                **(load_options or {}),
+            )
+            print(f"Batch {batch_id} {name} : {counts[(name, False)]} ligne(s) lue(s)")
+        finally:
+            cached.unpersist()
+
+    return write_batch
+
+
+def process_stream(
+    hdfs_dir,
+    db_url,
+    db_props,
+    text_rules=DEFAULT_TEXT_RULES,
+    quarantine_dir=None,
+    checkpoint_dir=None,
+    trigger_seconds=30,
+    max_files_per_trigger=None,
+    load_options=None,
+):
+    """Mode streaming : une requête Structured Streaming par dataset surveille
+    les runs déposés dans HDFS et les écrit dans PostgreSQL par micro-batch.
+
+    Les fichiers déjà traités sont suivis par le checkpoint de chaque requête
+    (défaut <hdfs_dir>/_checkpoints/stream/<dataset>) : au redémarrage, le
+    flux reprend après le dernier batch validé. trigger_seconds=0 traite les
+    fichiers disponibles puis s'arrête (rattrapage)."""
+    quarantine_dir = quarantine_dir or f"{hdfs_dir}/_quarantine"
+    checkpoint_dir = checkpoint_dir or f"{hdfs_dir}/_checkpoints/stream"
+    queries = []
+    for name in RAW_SCHEMAS:
+        writer = (
+            read_stream(hdfs_dir, name, max_files_per_trigger)
+            .writeStream.queryName(f"reddit_{name}")
+            .foreachBatch(
+                stream_batch_writer(
+                    name, db_url, db_props, text_rules, quarantine_dir, load_options
+                )
             )
+            .option("checkpointLocation", f"{checkpoint_dir}/{name}")
+        )
+        if trigger_seconds:
+            writer = writer.trigger(processingTime=f"{trigger_seconds} seconds")
         else:
-            print("Aucun post trouvé.")
+            writer = writer.trigger(availableNow=True)
+        queries.append(writer.start())
+        print(f"Flux {name} démarré (checkpoint {checkpoint_dir}/{name})")
+    try:
+        # Rend la main dès qu'une requête s'arrête ; en échec, son exception est levée
+        spark.streams.awaitAnyTermination()
+        for query in queries:
+            query.awaitTermination()
+    finally:
+        for query in queries:
+            query.stop()
+
+
+import traceback
+
+
+def process_data(
+    hdfs_dir,
+    db_url,
+    db_props,
+    since=None,
+    runs=None,
+    text_rules=DEFAULT_TEXT_RULES,
+    storage_level="MEMORY_AND_DISK",
+    quarantine_dir=None,
+    full_refresh=False,
+    load_options=None,
+):
+    """Lit posts et commentaires, les score et les écrit dans PostgreSQL.
 
-        # --- TRAITEMENT DES COMMENTAIRES ---
-        comments_path = f"{hdfs_dir}/comments.csv"
-        print(f"Lecture des Commentaires ({comments_path})...")
+    Chaque entrée n'est lue et scorée qu'une fois : les DataFrames scorés sont
+    persistés (storage_level, nom d'un StorageLevel) et matérialisés ensemble
+    par un seul job de comptage, qui sert aussi de test de vide. Les écritures
+    JDBC relisent ensuite le cache, en parallèle. Les lignes CSV mal formées
+    partent dans quarantine_dir (défaut <hdfs_dir>/_quarantine).
 
-        # On utilise try/except ou on vérifie si le fichier existe (difficile en pur Spark sans API Hadoop)
+    Les lignes sont fusionnées sur leur id (load_table, avec load_options :
+    loader, writers, batch_size) : un post relu par un
+    autre run ou une autre extraction met à jour sa ligne au lieu d'en ajouter
+    une. Les runs traités sont ajoutés au registre une fois tout écrit, sauf
+    avec since : leurs partitions plus anciennes n'ont pas été lues.
+    full_refresh remplace le contenu des tables (backfill). Les stats par
+    subreddit sont mises à jour dans la transaction de reddit_posts, à partir
+    des seules lignes du batch (stats_statements).
+    """
+    datasets = {}
+    cached = {}
+    try:
+        print(f"Lecture depuis le dossier HDFS : {hdfs_dir}")
+        quarantine_dir = quarantine_dir or f"{hdfs_dir}/_quarantine"
+        level = getattr(StorageLevel, storage_level)
+
+        print("Lecture des Posts...")
+        datasets["posts"] = read_raw(hdfs_dir, "posts", since, runs)
+
+        print("Lecture des Commentaires...")
         # On suppose que le fichier existe si l'extraction a marché.
         try:
-            df_comments = (
-                spark.read.option("header", "true")
-                .option("multiLine", "true")
-                .option("escape", '"')
-                .csv(comments_path)
-            )
+            datasets["comments"] = read_raw(hdfs_dir, "comments", since, runs)
+        except Exception as e:
+            print(f"Pas de fichier commentaires ou erreur lecture: {e}")
 
-            if df_comments.count() > 0:
-                df_comments_clean = (
-                    df_comments.withColumn("clean_body", clean_udf(col("body")))
-                    .withColumn("sentiment", sent_udf(col("clean_body")))
-                    .withColumn("score", expr("try_cast(score as float)"))
-                )
+        cached = {
+            name: score_text(df, text_rules).persist(level)
+            for name, df in datasets.items()
+        }
+        counts = count_rows(cached)
 
-                print("Écriture Commentaires dans PostgreSQL...")
-                df_comments_clean.write.jdbc(
-                    url=db_url,
-                    table="reddit_comments",
-                    mode="append",
-                    properties=db_props,
+        writes = []
+        for name, df in cached.items():
+            if counts[(name, True)]:
+                path = quarantine(df, quarantine_dir, name)
+                print(
+                    f"{name} : {counts[(name, True)]} ligne(s) mal formée(s) -> {path}"
+                )
+            if counts[(name, False)]:
+                print(f"{name} : {counts[(name, False)]} ligne(s) à écrire")
+                datasets[name] = df.where(col(CORRUPT_COLUMN).isNull()).drop(
+                    CORRUPT_COLUMN, SOURCE_FILE_COLUMN
                 )
-            else:
-                print("Fichier commentaires vide.")
-        except Exception as e:
-            print(f"Pas de fichier commentaires ou erreur lecture: {e}")
+
+        if counts[("posts", False)]:
+            writes.append("posts")
+        else:
+            print("Aucun post trouvé.")
+
+        if counts.get(("comments", False)):
+            writes.append("comments")
+        elif "comments" in datasets:
+            print("Fichier commentaires vide.")
+
+        def load(name):
+            table = TABLES[name]
+            staging = f"{table}_staging"
+            print(f"Écriture {table} dans PostgreSQL (upsert sur id)...")
+            before, after = (
+                stats_statements(staging, full_refresh) if name == "posts" else ((), ())
+            )
+            # Backfill : la table est vidée dans la transaction de la fusion
+            load_table(
+                datasets[name],
+                table,
+                db_url,
+                db_props,
+                staging=staging,
+                replace=full_refresh,
+                before=before,
+                after=after,
+                **(load_options or {}),
+            )
+
+        # Jobs indépendants sur les données en cache : soumis en même temps
+        if writes:
+            with ThreadPoolExecutor(max_workers=len(writes)) as pool:
+                for future in [pool.submit(load, name) for name in writes]:
+                    future.result()
+
+        if runs is not None and since:
+            # Partitions antérieures à since non lues : les runs restent à traiter
+            print("--since : runs non ajoutés au registre (lecture partielle)")
+        elif runs is not None:
+            record_processed(
+                hdfs_dir,
+                runs,
+                {name: counts[(name, False)] for name in datasets},
+                full_refresh=full_refresh,
+            )
 
         print("Traitement terminé avec succès.")
 
@@ -123,14 +851,95 @@ def process_data(hdfs_dir, db_url, db_props):
             f.write("ERREUR SPARK:\n")
             traceback.print_exc(file=f)
         sys.exit(1)
+    finally:
+        for df in cached.values():
+            df.unpersist()
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: spark_processor.py <hdfs_directory>")
-        sys.exit(1)
-
-    hdfs_dir = sys.argv[1]
+    parser = argparse.ArgumentParser(usage="spark_processor.py <hdfs_directory>")
+    parser.add_argument("hdfs_dir")
+    parser.add_argument(
+        "--since",
+        help="AAAA-MM-JJ : ne lit que les partitions Parquet à partir de cette date "
+        "(les runs lus ne sont pas marqués traités)",
+    )
+    parser.add_argument(
+        "--runs",
+        nargs="+",
+        default=["new"],
+        help="Runs à traiter : new (défaut, absents du registre _processed), "
+        "latest, all ou des run_id",
+    )
+    parser.add_argument(
+        "--full-refresh",
+        dest="full_refresh",
+        action="store_true",
+        help="Retraite tous les runs et remplace le contenu des tables (backfill)",
+    )
+    parser.add_argument(
+        "--text_rules",
+        nargs="+",
+        choices=[*TEXT_RULES, "all"],
+        default=DEFAULT_TEXT_RULES,
+        help="Normalisation de body (défaut : lower trim, comme l'ancienne UDF)",
+    )
+    parser.add_argument(
+        "--storage_level",
+        default="MEMORY_AND_DISK",
+        choices=[
+            "MEMORY_ONLY",
+            "MEMORY_AND_DISK",
+            "MEMORY_AND_DISK_DESER",
+            "DISK_ONLY",
+            "OFF_HEAP",
+        ],
+        help="Niveau de cache des données scorées (relues par chaque écriture)",
+    )
+    parser.add_argument(
+        "--quarantine_dir",
+        help="Lignes mal formées (défaut : <hdfs_dir>/_quarantine)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Structured Streaming : traite les runs au fil de leur dépôt dans HDFS",
+    )
+    parser.add_argument(
+        "--trigger_seconds",
+        type=int,
+        default=30,
+        help="Intervalle entre micro-batchs (--stream) ; 0 = traite l'existant puis s'arrête",
+    )
+    parser.add_argument(
+        "--max_files_per_trigger",
+        type=int,
+        help="Fichiers lus au plus par micro-batch (--stream)",
+    )
+    parser.add_argument(
+        "--checkpoint_dir",
+        help="Checkpoints du mode --stream (défaut : <hdfs_dir>/_checkpoints/stream)",
+    )
+    parser.add_argument(
+        "--loader",
+        choices=["copy", "jdbc"],
+        default="copy",
+        help="Chargement PostgreSQL : COPY FROM STDIN (défaut, psycopg2 requis) "
+        "ou écritures JDBC",
+    )
+    parser.add_argument(
+        "--writers",
+        type=int,
+        help="Connexions d'écriture parallèles (défaut : une par partition)",
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=LOAD_BATCH_SIZE,
+        help="Lignes par envoi à PostgreSQL",
+    )
+    args = parser.parse_args()
+    text_rules = list(TEXT_RULES) if "all" in args.text_rules else args.text_rules
 
     # Config Postgres
     db_url = "jdbc:postgresql://postgres_db:5432/reddit_db"
@@ -140,5 +949,59 @@ if __name__ == "__main__":
         "driver": "org.postgresql.Driver",
     }
 
-    process_data(hdfs_dir, db_url, db_props)
+    loader = args.loader
+    if loader == "copy" and not PSYCOPG2_AVAILABLE:
+        print("psycopg2 non installé : chargement par JDBC.")
+        loader = "jdbc"
+    load_options = {
+        "loader": loader,
+        "writers": args.writers,
+        "batch_size": args.batch_size,
+    }
+
+    if args.stream:
+        process_stream(
+            args.hdfs_dir,
+            db_url,
+            db_props,
+            text_rules=text_rules,
+            quarantine_dir=args.quarantine_dir,
+            checkpoint_dir=args.checkpoint_dir,
+            trigger_seconds=args.trigger_seconds,
+            max_files_per_trigger=args.max_files_per_trigger,
+            load_options=load_options,
+        )
+        spark.stop()
+        raise SystemExit(0)
+
+    runs = list_runs(args.hdfs_dir)
+    if runs is not None:
+        selection = ["all"] if args.full_refresh else args.runs
+        processed = processed_runs(args.hdfs_dir)
+        selected = select_runs(runs, selection, processed)
+        print(
+            f"{len(selected)} run(s) sélectionné(s) sur {len(runs)} publiés "
+            f"({len(processed)} déjà traités)"
+        )
+        runs = selected
+    elif not args.full_refresh:
+        print("Pas de manifeste de runs : tout le dossier est retraité.")
+
+    if runs == []:
+        print("Aucun nouveau run à traiter.")
+        spark.stop()
+        raise SystemExit(0)
+
+    process_data(
+        args.hdfs_dir,
+        db_url,
+        db_props,
+        since=args.since,
+        runs=runs,
+        text_rules=text_rules,
+        storage_level=args.storage_level,
+        quarantine_dir=args.quarantine_dir,
+        full_refresh=args.full_refresh,
+        load_options=load_options,
+    )
     spark.stop()
@@ -0,0 +1,83 @@
+"""Compression en flux des fichiers extraits (CSV bruts).
+
+Chaque bloc écrit est encodé en un membre gzip / une trame zstd complet : le
+fichier est la simple concaténation des blocs. Il reste lisible à tout moment
+(gzip, zstd, pandas, Spark via les codecs Hadoop .gz / .zst), une reprise le
+complète sans réencodage, et les blocs partent vers HDFS déjà compressés.
+"""
+
+import gzip
+import io
+import os
+
+try:
+    import zstandard
+
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Codec par défaut : gzip est lu par Spark sans bibliothèque native Hadoop
+COMPRESSION = "gzip"
+
+# Extension ajoutée au nom de fichier (Spark et pandas en déduisent le codec)
+EXTENSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+# Niveaux par défaut : l'encodage ne doit pas ralentir l'extraction
+LEVELS = {"gzip": 6, "zstd": 3}
+
+
+def compressed_path(path, codec):
+    """posts.csv -> posts.csv.gz / posts.csv.zst selon le codec."""
+    return path + EXTENSIONS[codec]
+
+
+def codec_variants(path):
+    """Chemins possibles d'un même fichier, tous codecs confondus."""
+    return [path + ext for ext in EXTENSIONS.values()]
+
+
+def find_compressed(path):
+    """Premier fichier existant parmi path, path.gz, path.zst (ou None)."""
+    return next((p for p in codec_variants(path) if os.path.exists(p)), None)
+
+
+class ChunkEncoder:
+    """Encode des blocs d'octets indépendants pour le codec donné
+    (none, gzip, zstd)."""
+
+    def __init__(self, codec=COMPRESSION, level=None):
+        if codec not in EXTENSIONS:
+            raise ValueError(f"Codec inconnu : {codec} (choix : {list(EXTENSIONS)})")
+        if codec == "zstd" and not ZSTD_AVAILABLE:
+            raise ImportError("zstandard est requis pour la compression zstd")
+        self.codec = codec
+        self.level = LEVELS.get(codec) if level is None else level
+        if codec == "gzip":
+            self._encode = self._gzip
+        elif codec == "zstd":
+            self._encode = zstandard.ZstdCompressor(level=self.level).compress
+        else:
+            self._encode = bytes
+
+    def _gzip(self, data):
+        # mtime=0 : même bloc, mêmes octets (fichiers reproductibles)
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def encode(self, data):
+        return self._encode(data)
+
+
+def decode(data, codec):
+    """Décode un fichier entier (concaténation de blocs) en octets."""
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise ImportError("zstandard est requis pour la compression zstd")
+        # read_across_frames : un bloc = une trame
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            io.BytesIO(data), read_across_frames=True
+        )
+        return reader.read()
+    return data
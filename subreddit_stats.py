@@ -0,0 +1,160 @@
+"""Statistiques par subreddit maintenues incrémentalement dans PostgreSQL.
+
+reddit_stats_agg garde, par subreddit et par métrique, des agrégats
+fusionnables : nombre, somme, somme des carrés, min et max. Chaque job y
+fusionne la contribution de son batch (lignes écrites moins les valeurs
+qu'elles remplacent) sans relire reddit_posts. reddit_stats, lue par le
+dashboard, en dérive moyennes et variances pour les subreddits touchés.
+
+Les fonctions renvoient des requêtes SQL à exécuter dans la transaction qui
+modifie reddit_posts (spark_processor.py, metrics_refresh.py) :
+bootstrap_statements() et delta_statements() avant la modification,
+merge_statements() après.
+"""
+
+METRICS = ["score", "sentiment", "num_comments"]
+AGG_TABLE = "reddit_stats_agg"
+STATS_TABLE = "reddit_stats"
+DELTA_TABLE = "reddit_stats_delta"
+
+_AGGREGATES = ["count", "sum", "sumsq", "min", "max"]
+AGG_COLUMNS = ["posts"] + [f"{m}_{a}" for m in METRICS for a in _AGGREGATES]
+
+
+def _agg_definition():
+    columns = ["subreddit TEXT PRIMARY KEY", "posts BIGINT"]
+    for m in METRICS:
+        columns += [f"{m}_count BIGINT"] + [
+            f"{m}_{a} DOUBLE PRECISION" for a in _AGGREGATES[1:]
+        ]
+    return ", ".join(columns)
+
+
+def _derived_columns():
+    """Colonnes de reddit_stats (noms historiques "avg(...)" du dashboard)."""
+    columns = ["subreddit", "posts"]
+    for m in METRICS:
+        mean = f"{m}_sum / NULLIF({m}_count, 0)"
+        columns += [
+            f'{mean} AS "avg({m})"',
+            # Variance de population ; GREATEST absorbe les erreurs d'arrondi
+            f"GREATEST({m}_sumsq / NULLIF({m}_count, 0) - ({mean}) ^ 2, 0) "
+            f'AS "var({m})"',
+            f'{m}_min AS "min({m})"',
+            f'{m}_max AS "max({m})"',
+        ]
+    return ", ".join(columns)
+
+
+def bootstrap_statements():
+    """Crée reddit_stats_agg au premier passage, à partir du contenu actuel de
+    reddit_posts (seul parcours complet), et reconstruit reddit_stats."""
+    return [
+        "DO $$ BEGIN "
+        f"IF to_regclass('{AGG_TABLE}') IS NULL THEN "
+        f"CREATE TABLE {AGG_TABLE} ({_agg_definition()}); "
+        "IF to_regclass('reddit_posts') IS NOT NULL THEN "
+        f"INSERT INTO {AGG_TABLE} (subreddit, {', '.join(AGG_COLUMNS)}) "
+        f"SELECT subreddit, {_full_scan_aggregates()} "
+        "FROM reddit_posts GROUP BY subreddit; "
+        "END IF; "
+        f"DROP TABLE IF EXISTS {STATS_TABLE}; "
+        f"CREATE TABLE {STATS_TABLE} AS "
+        f"SELECT {_derived_columns()} FROM {AGG_TABLE}; "
+        "END IF; END $$"
+    ]
+
+
+def _full_scan_aggregates():
+    aggregates = ["count(*)"]
+    for m in METRICS:
+        value = f"{m}::double precision"
+        aggregates += [
+            f"count({m})",
+            f"sum({value})",
+            f"sum({value} * {value})",
+            f"min({value})",
+            f"max({value})",
+        ]
+    return ", ".join(aggregates)
+
+
+def reset_statements():
+    """Vide les stats (backfill : reddit_posts est vidée dans la même transaction)."""
+    return [f"TRUNCATE {AGG_TABLE}", f"TRUNCATE {STATS_TABLE}"]
+
+
+def delta_statements(rows_sql):
+    """Contribution du batch par subreddit, à calculer avant la modification.
+
+    rows_sql produit (subreddit, score, sentiment, num_comments, sign) : +1
+    pour les valeurs écrites, -1 pour celles qu'elles remplacent. Une ligne
+    inchangée s'annule. Min et max ne se soustraient pas : les extrêmes
+    retirés sont gardés à part pour merge_statements."""
+    columns = ["sum(sign) AS posts"]
+    for m in METRICS:
+        value = f"{m}::double precision"
+        columns += [
+            f"sum(sign) FILTER (WHERE {m} IS NOT NULL) AS {m}_count",
+            f"sum(sign * {value}) AS {m}_sum",
+            f"sum(sign * {value} * {value}) AS {m}_sumsq",
+            f"min({value}) FILTER (WHERE sign > 0) AS {m}_min",
+            f"max({value}) FILTER (WHERE sign > 0) AS {m}_max",
+            f"min({value}) FILTER (WHERE sign < 0) AS {m}_removed_min",
+            f"max({value}) FILTER (WHERE sign < 0) AS {m}_removed_max",
+        ]
+    return [
+        f"DROP TABLE IF EXISTS {DELTA_TABLE}",
+        f"CREATE TEMP TABLE {DELTA_TABLE} ON COMMIT DROP AS "
+        f"SELECT subreddit, {', '.join(columns)} "
+        f"FROM ({rows_sql}) AS batch "
+        "(subreddit, score, sentiment, num_comments, sign) "
+        "GROUP BY subreddit",
+    ]
+
+
+def merge_statements():
+    """Fusionne la contribution du batch dans reddit_stats_agg (O(subreddits
+    du batch)) et met à jour leurs lignes de reddit_stats.
+
+    Si une valeur retirée était le min ou le max d'un subreddit, ses extrêmes
+    sont recalculés sur reddit_posts : seul cas de relecture, limité à ces
+    subreddits."""
+    columns = ", ".join(AGG_COLUMNS)
+    merged = ["posts = a.posts + EXCLUDED.posts"]
+    stale = []
+    for m in METRICS:
+        merged += [
+            # Somme sur des valeurs toutes NULL : NULL, compté comme 0
+            f"{m}_{a} = COALESCE(a.{m}_{a}, 0) + COALESCE(EXCLUDED.{m}_{a}, 0)"
+            for a in ("count", "sum", "sumsq")
+        ] + [
+            # LEAST / GREATEST ignorent NULL
+            f"{m}_min = LEAST(a.{m}_min, EXCLUDED.{m}_min)",
+            f"{m}_max = GREATEST(a.{m}_max, EXCLUDED.{m}_max)",
+        ]
+        stale += [
+            f"d.{m}_removed_min <= s.{m}_min",
+            f"d.{m}_removed_max >= s.{m}_max",
+        ]
+    extremes = ", ".join(
+        f"{fn}({m}::double precision) AS {m}_{fn}"
+        for m in METRICS
+        for fn in ("min", "max")
+    )
+    touched = f"subreddit IN (SELECT subreddit FROM {DELTA_TABLE})"
+    return [
+        f"INSERT INTO {AGG_TABLE} AS a (subreddit, {columns}) "
+        f"SELECT subreddit, {columns} FROM {DELTA_TABLE} "
+        f"ON CONFLICT (subreddit) DO UPDATE SET {', '.join(merged)}",
+        f"UPDATE {AGG_TABLE} a SET "
+        + ", ".join(f"{m}_{fn} = r.{m}_{fn}" for m in METRICS for fn in ("min", "max"))
+        + f" FROM (SELECT subreddit, {extremes} FROM reddit_posts "
+        f"WHERE subreddit IN (SELECT d.subreddit FROM {DELTA_TABLE} d "
+        f"JOIN {AGG_TABLE} s ON s.subreddit = d.subreddit "
+        f"WHERE {' OR '.join(stale)}) GROUP BY subreddit) r "
+        "WHERE a.subreddit = r.subreddit",
+        f"DELETE FROM {STATS_TABLE} WHERE {touched}",
+        f"INSERT INTO {STATS_TABLE} "
+        f"SELECT {_derived_columns()} FROM {AGG_TABLE} WHERE {touched}",
+    ]
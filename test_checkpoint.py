@@ -0,0 +1,46 @@
+import pytest
+
+from extraction_reddit import CheckpointStore, PendingRunError
+
+
+def _store(tmp_path):
+    return CheckpointStore(str(tmp_path / "checkpoint.json"))
+
+
+def _post(post_id):
+    return {"created_utc": 1_700_000_000.0, "id": post_id}
+
+
+def test_interrupted_run_resumes_remaining_subreddits(tmp_path):
+    store = _store(tmp_path)
+    assert store.start_run(["a", "b", "c"], "run1") == (["a", "b", "c"], False)
+    store.complete_subreddit("a", _post("p1"))
+
+    store = _store(tmp_path)
+    assert store.start_run(["c", "b", "a"], "run2") == (["c", "b"], True)
+    assert store.run_id == "run1"
+    assert store.watermark("a") == _post("p1")
+
+
+def test_pending_run_on_other_subreddits_is_refused(tmp_path):
+    store = _store(tmp_path)
+    store.start_run(["a", "b"], "run1")
+    store.complete_subreddit("a", _post("p1"))
+
+    with pytest.raises(PendingRunError, match="run1"):
+        _store(tmp_path).start_run(["x"], "run2")
+    # Le run interrompu est intact
+    assert _store(tmp_path).start_run(["a", "b"], "run3") == (["b"], True)
+
+    store.finish_run()
+    assert _store(tmp_path).start_run(["x"], "run2") == (["x"], False)
+
+
+def test_completed_list_stays_bounded(tmp_path):
+    store = _store(tmp_path)
+    store.start_run(["a"], "run1")
+    # Daemon : le même subreddit terminé à chaque poll, et des subreddits hors run
+    for _ in range(3):
+        store.complete_subreddit("a", _post("p1"))
+        store.complete_subreddit("z", _post("p2"))
+    assert store.state["pending_run"]["completed"] == ["a"]
@@ -0,0 +1,119 @@
+import os
+import signal
+
+from activity_scheduler import ActivityScheduler
+from extraction_reddit import CheckpointStore, run_daemon
+from rate_limiter import RateLimiter
+from reddit_replay import SyntheticReddit
+from seen_index import SeenIndex
+
+
+def _run_daemon(tmp_path, **kwargs):
+    """Lance le daemon sur synth00000 ; upload doit l'arrêter (SIGTERM)."""
+    kwargs.setdefault("flush_interval", 3600)
+    previous = signal.getsignal(signal.SIGTERM)
+    try:
+        run_daemon(
+            ["synth00000"],
+            "/reddit_data",
+            limit=100,
+            batch_root=str(tmp_path / "batches"),
+            scheduler=ActivityScheduler(path=None),
+            **kwargs,
+        )
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+
+
+def _stop_after_upload(uploads):
+    def upload(paths, hdfs_dir, run):
+        uploads.append(run["rows"])
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    return upload
+
+
+def _post_watermark(checkpoint, index):
+    # Posts synthétiques : un par minute, du plus récent au plus ancien
+    checkpoint.complete_subreddit(
+        "synth00000",
+        {
+            "created_utc": SyntheticReddit.BASE_UTC - index * 60,
+            "id": f"synth00000_{index}",
+        },
+    )
+
+
+def test_failed_size_flush_keeps_watermark(tmp_path):
+    """Un flush sur flush_records coupe le poll de synth00000 ; son upload
+    échoue : le "done" du poll ne doit pas valider le watermark des posts
+    perdus."""
+    uploads = []
+
+    def upload(paths, hdfs_dir, run):
+        uploads.append(run["rows"])
+        if len(uploads) == 1:
+            raise OSError("HDFS indisponible")
+        # Deuxième micro-batch envoyé : arrêt du daemon (dernier flush compris)
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    checkpoint = CheckpointStore(str(tmp_path / "checkpoint.json"))
+    seen_index = SeenIndex(str(tmp_path / "seen.db"))
+    _run_daemon(
+        tmp_path,
+        checkpoint=checkpoint,
+        seen_index=seen_index,
+        flush_records=50,
+        client_factory=lambda: SyntheticReddit(1, 300, 0),
+        upload=upload,
+    )
+
+    assert uploads[0] == {"posts": 50, "comments": 0}
+    assert uploads[1] == {"posts": 50, "comments": 0}
+    assert checkpoint.watermark("synth00000") is None
+    assert CheckpointStore(checkpoint.path).watermark("synth00000") is None
+    # Les 50 premiers posts seront ré-extraits, les suivants sont validés
+    assert not seen_index.contains("t3_synth00000_0")
+    assert seen_index.contains("t3_synth00000_99")
+    seen_index.close()
+
+
+def test_poll_pages_down_to_post_watermark(tmp_path):
+    """250 posts depuis le watermark pour une limite de poll de 100 : le
+    listing continue jusqu'au watermark au lieu de laisser un trou."""
+    uploads = []
+    checkpoint = CheckpointStore(str(tmp_path / "checkpoint.json"))
+    _post_watermark(checkpoint, 250)
+    budget = RateLimiter(requests_per_minute=0)
+    _run_daemon(
+        tmp_path,
+        checkpoint=checkpoint,
+        client_factory=lambda: SyntheticReddit(1, 300, 0),
+        upload=_stop_after_upload(uploads),
+        budget=budget,
+        flush_interval=0,
+    )
+
+    assert uploads == [{"posts": 250, "comments": 0}]
+    assert checkpoint.watermark("synth00000")["id"] == "synth00000_0"
+    assert not budget.lost
+
+
+def test_post_watermark_beyond_listing_cap_is_lost(tmp_path):
+    """Watermark plus loin que les 1000 éléments d'un listing : la lecture
+    s'arrête au plafond et la perte est comptée."""
+    uploads = []
+    checkpoint = CheckpointStore(str(tmp_path / "checkpoint.json"))
+    _post_watermark(checkpoint, 1100)
+    budget = RateLimiter(requests_per_minute=0)
+    _run_daemon(
+        tmp_path,
+        checkpoint=checkpoint,
+        client_factory=lambda: SyntheticReddit(1, 1200, 0),
+        upload=_stop_after_upload(uploads),
+        budget=budget,
+        flush_interval=0,
+    )
+
+    assert uploads == [{"posts": 1000, "comments": 0}]
+    assert budget.lost["listings"] == 1
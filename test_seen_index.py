@@ -0,0 +1,52 @@
+from seen_index import SeenIndex
+
+
+def _open(tmp_path):
+    return SeenIndex(str(tmp_path / "seen.db"), capacity=1000)
+
+
+def test_pending_ids_are_seen_until_rollback(tmp_path):
+    index = _open(tmp_path)
+    assert index.check_and_add("post", "a")
+    assert not index.check_and_add("post", "a")
+    # Même id, autre type : fullname différent
+    assert index.check_and_add("comment", "a")
+    index.rollback()
+    assert index.check_and_add("post", "a")
+    index.close()
+
+
+def test_commit_persists_and_close_rolls_back(tmp_path):
+    index = _open(tmp_path)
+    index.check_and_add("post", "written")
+    index.commit()
+    index.check_and_add("post", "unwritten")
+    index.close()
+
+    index = _open(tmp_path)
+    assert index.contains("t3_written")
+    # Ids en attente à la fermeture : données jamais confirmées, ré-extraites
+    assert not index.contains("t3_unwritten")
+    index.close()
+
+
+def test_bloom_is_reloaded_then_rebuilt_when_stale(tmp_path):
+    index = _open(tmp_path)
+    for i in range(100):
+        index.check_and_add("post", str(i))
+    index.commit()
+    index.close()
+
+    index = _open(tmp_path)
+    assert index._bloom.count == 100
+    assert all(index.contains(f"t3_{i}") for i in range(100))
+    index.check_and_add("post", "after_reload")
+    index.commit()
+    # Arrêt brutal : le filtre enregistré ne compte pas le dernier id
+    index._conn.close()
+
+    index = _open(tmp_path)
+    assert index._bloom.count == 101
+    assert index.contains("t3_after_reload")
+    assert not index.check_and_add("post", "after_reload")
+    index.close()
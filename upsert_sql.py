@@ -0,0 +1,81 @@
+"""Requêtes SQL de fusion des tables de staging dans PostgreSQL, sans
+dépendance à Spark : load_table (spark_processor.py) les exécute dans une
+seule transaction, et les tests les exécutent sur un vrai PostgreSQL.
+"""
+
+import subreddit_stats
+
+# Rang de chaque ligne dans le DataFrame chargé, ajouté aux tables de staging :
+# avec des COPY parallèles, l'ordre physique (ctid) n'est pas l'ordre de df
+LOAD_ORDER_COLUMN = "_load_seq"
+# Doublons d'un id dans staging : la dernière ligne de df est retenue
+LATEST_STAGED = f"s.id, s.{LOAD_ORDER_COLUMN} DESC"
+
+
+def primary_key_statement(table):
+    """Ajoute la clé primaire (id) à une table créée sans clé par les anciennes
+    versions du job, après avoir retiré ses doublons et ses id nuls."""
+    return (
+        "DO $$ BEGIN "
+        "IF NOT EXISTS (SELECT 1 FROM pg_constraint "
+        f"WHERE conrelid = '{table}'::regclass AND contype = 'p') THEN "
+        f"DELETE FROM {table} WHERE id IS NULL; "
+        f"DELETE FROM {table} a USING {table} b "
+        "WHERE a.id = b.id AND a.ctid < b.ctid; "
+        f"ALTER TABLE {table} ADD PRIMARY KEY (id); "
+        "END IF; END $$"
+    )
+
+
+def upsert_statements(table, staging, columns, replace=False, before=()):
+    """Fusionne staging dans table sur la clé id : les nouvelles lignes sont
+    insérées, les lignes existantes mises à jour si une valeur a changé. Un
+    batch rejoué (ou un run compacté relu) ne duplique rien.
+
+    replace vide d'abord la table (backfill) ; before s'exécute juste avant
+    la fusion, table encore inchangée."""
+    names = ", ".join(f'"{c}"' for c in columns)
+    values = ", ".join(f's."{c}"' for c in columns)
+    updated = [c for c in columns if c != "id"]
+    assignments = ", ".join(f'"{c}" = EXCLUDED."{c}"' for c in updated)
+    current = ", ".join(f'{table}."{c}"' for c in updated)
+    incoming = ", ".join(f'EXCLUDED."{c}"' for c in updated)
+    statements = [
+        # Colonnes de staging sans LOAD_ORDER_COLUMN
+        f"CREATE TABLE IF NOT EXISTS {table} AS "
+        f"SELECT {names} FROM {staging} WITH NO DATA",
+        primary_key_statement(table),
+    ]
+    if replace:
+        statements.append(f"TRUNCATE {table}")
+    statements += before
+    statements.append(
+        f"INSERT INTO {table} ({names}) "
+        # Un id présent deux fois dans le batch : une seule ligne (ON CONFLICT
+        # ne peut pas modifier deux fois la même ligne dans une requête)
+        f"SELECT DISTINCT ON (s.id) {values} FROM {staging} s "
+        f"WHERE s.id IS NOT NULL ORDER BY {LATEST_STAGED} "
+        f"ON CONFLICT (id) DO UPDATE SET {assignments} "
+        # Ligne inchangée : pas de réécriture
+        f"WHERE ({current}) IS DISTINCT FROM ({incoming})"
+    )
+    return statements
+
+
+def stats_statements(staging, replace=False):
+    """Requêtes (before, after) de load_table qui fusionnent dans les stats par
+    subreddit (subreddit_stats.py) la contribution de staging : ses lignes,
+    moins les valeurs de reddit_posts qu'elles remplacent."""
+    rows = (
+        "(SELECT DISTINCT ON (s.id) s.subreddit, s.score, s.sentiment, "
+        f"s.num_comments, 1 FROM {staging} s "
+        f"WHERE s.id IS NOT NULL ORDER BY {LATEST_STAGED}) "
+        "UNION ALL "
+        "(SELECT t.subreddit, t.score, t.sentiment, t.num_comments, -1 "
+        f"FROM reddit_posts t WHERE t.id IN (SELECT id FROM {staging}))"
+    )
+    before = subreddit_stats.bootstrap_statements()
+    if replace:
+        before += subreddit_stats.reset_statements()
+    before += subreddit_stats.delta_statements(rows)
+    return before, subreddit_stats.merge_statements()